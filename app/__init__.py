@@ -1,11 +1,148 @@
-from flask import Flask
+from flask import Flask, Request, abort, jsonify, request
+from flask.logging import default_handler
+from flask.json.provider import JSONProvider
+import atexit
+import logging
+import queue
+import threading
+import time
+from tempfile import SpooledTemporaryFile
+from logging.handlers import QueueHandler, QueueListener
+import orjson
+from werkzeug.exceptions import RequestEntityTooLarge
 from app.controllers.faces_controller import faces_bp
+from app.controllers.embeddings_controller import embeddings_bp
+from app.services.milvus_service import init_milvus
+
+
+class ORJSONProvider(JSONProvider):
+    """
+    Provider JSON do Flask baseado em orjson.
+
+    Substitui o encoder da stdlib em `jsonify` e `request.get_json`; arrays
+    numpy (ex.: embeddings) são serializados diretamente, sem `.tolist()`.
+    """
+
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.options, default=str).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Entrega os bytes do orjson direto ao Response, sem decode/encode
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, option=self.options, default=str)
+        return self._app.response_class(body, mimetype="application/json")
+
+
+# Tamanho máximo do corpo das requisições (uploads de imagem)
+MAX_UPLOAD_SIZE = 20 << 20
+
+
+class UploadRequest(Request):
+    """
+    Request que mantém os arquivos enviados em memória.
+
+    O werkzeug despeja em disco qualquer upload acima de 500 KB; aqui o limite
+    do spool acompanha o `MAX_CONTENT_LENGTH`, então imagens comuns nunca
+    passam por arquivo temporário.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=MAX_UPLOAD_SIZE, mode="rb+")
+
+
+class _InProcessQueueHandler(QueueHandler):
+    """QueueHandler que não formata o registro antes de enfileirar (fila em memória)."""
+
+    def prepare(self, record):
+        return record
+
+
+class DuplicateExceptionFilter(logging.Filter):
+    """
+    Descarta exceções repetidas dentro de uma janela de tempo.
+
+    Durante uma indisponibilidade (ex.: Milvus fora do ar) todas as requisições
+    falham com o mesmo erro; só a primeira ocorrência por `window` segundos é
+    registrada, e a seguinte informa quantas foram suprimidas.
+    """
+
+    def __init__(self, window=10.0, max_keys=1024):
+        super().__init__()
+        self.window = window
+        self.max_keys = max_keys
+        self._seen = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not record.exc_info:
+            return True
+
+        exc_type, exc, _ = record.exc_info
+        key = (exc_type, str(exc))
+        now = time.monotonic()
+
+        with self._lock:
+            last, suppressed = self._seen.get(key, (0.0, 0))
+            if now - last < self.window:
+                self._seen[key] = (last, suppressed + 1)
+                return False
+
+            if len(self._seen) >= self.max_keys:
+                self._seen.clear()
+            self._seen[key] = (now, 0)
+
+        if suppressed:
+            record.msg = f"{record.msg} ({suppressed} ocorrências iguais suprimidas)"
+        return True
+
+
+def configure_logging(app):
+    """
+    Direciona o logger do Flask para uma fila atendida por uma thread própria.
+
+    A thread da requisição apenas enfileira o registro; a formatação do
+    traceback e a escrita em stderr acontecem no `QueueListener`.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, default_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    app.logger.removeHandler(default_handler)
+    handler = _InProcessQueueHandler(log_queue)
+    handler.addFilter(DuplicateExceptionFilter())
+    app.logger.addHandler(handler)
+    if app.logger.level == logging.NOTSET:
+        app.logger.setLevel(logging.INFO)
 
 
 def create_app():
     app = Flask(__name__)
+    app.request_class = UploadRequest
+    app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_SIZE
+    app.json = ORJSONProvider(app)
+    configure_logging(app)
+
+    @app.before_request
+    def reject_oversized_body():
+        # Rejeita pelo Content-Length antes de a rota começar a ler o corpo
+        if request.content_length and request.content_length > MAX_UPLOAD_SIZE:
+            abort(413)
+
+    @app.errorhandler(RequestEntityTooLarge)
+    def request_too_large(e):
+        return jsonify({"error": f"Arquivo excede o limite de {MAX_UPLOAD_SIZE >> 20} MB."}), 413
 
     # Registrar todos os blueprints
     app.register_blueprint(faces_bp)
+    app.register_blueprint(embeddings_bp)
+
+    # Conexão e collection compartilhadas por todas as rotas
+    init_milvus()
 
     return app
@@ -0,0 +1,158 @@
+from flask import Blueprint, Response, current_app, request, jsonify
+from app.services.embeddings_service import (
+    generate_embeddings, compare_embeddings, encode_embedding, wait_processed_image
+)
+from app.services.redis_service import redis_conn, redis_wait_conn, job_serializer
+from app.workers import process_generate_embeddings, process_compare_embeddings
+from rq import Queue
+from rq.job import Job
+from rq.results import Result
+import msgspec
+import numpy as np
+import os
+
+embeddings_bp = Blueprint("embeddings", __name__)
+
+# Com INFERENCE_ON_WORKER=1 o FaceNet roda só nos workers da fila de embeddings
+# (modelo carregado e aquecido uma vez), e não em cada processo da API
+INFERENCE_ON_WORKER = os.getenv("INFERENCE_ON_WORKER") == "1"
+# Espera máxima (segundos) pelo resultado do worker de inferência
+INFERENCE_TIMEOUT = int(os.getenv("INFERENCE_TIMEOUT", 10))
+embeddings_queue = Queue("faces_embeddings_queue", connection=redis_conn, serializer=job_serializer)
+
+# Formatos aceitos em /embeddings (o primeiro é o padrão, inclusive para */*)
+EMBEDDING_MIMETYPES = ["application/json", "application/msgpack", "application/octet-stream"]
+_msgpack_encoder = msgspec.msgpack.Encoder()
+
+
+def _run_on_worker(task, *args):
+    """
+    Executa a inferência na fila de embeddings e aguarda o resultado.
+
+    A espera é um XREAD bloqueante no stream de resultados do job (conexão de
+    leituras bloqueantes), sem polling.
+
+    Returns:
+        tuple: (resultado, código HTTP) devolvidos pelo worker; 504 se o
+        worker não responder em `INFERENCE_TIMEOUT` segundos.
+    """
+    job = embeddings_queue.enqueue(task, *args, result_ttl=60, failure_ttl=300)
+    waiter = Job(job.id, connection=redis_wait_conn, serializer=job_serializer)
+
+    result = waiter.latest_result(timeout=INFERENCE_TIMEOUT)
+    if result is None:
+        return {"error": "Tempo esgotado aguardando o worker de inferência.", "job_id": job.id}, 504
+    if result.type != Result.Type.SUCCESSFUL:
+        return {"error": "Falha no worker de inferência.", "job_id": job.id}, 500
+
+    body, status = result.return_value
+    return body, status
+
+
+# ============================================================
+#  Gerar embedding de uma imagem
+# ============================================================
+@embeddings_bp.route("/embeddings", methods=["POST"])
+def embeddings():
+    """
+    Gera o embedding facial da primeira face detectada na imagem enviada.
+
+    O vetor é devolvido como float32 little-endian em base64, bem menor e mais
+    barato de serializar do que uma lista JSON de floats. Para decodificar:
+    `np.frombuffer(base64.b64decode(embedding_b64), dtype=np.float32)`.
+
+    Clientes que não precisam de JSON negociam o formato pelo `Accept`:
+        - application/msgpack: mesmo envelope, com `embedding` em bytes
+          float32 little-endian (sem base64).
+        - application/octet-stream: apenas os bytes float32 do vetor
+          (dimensão no header `X-Embedding-Dim`).
+
+    Request Body (form-data):
+        image (file): Imagem contendo ao menos um rosto.
+
+    Returns:
+        tuple:
+            - Response (JSON ou msgpack): embedding_b64 (ou embedding), dtype, dim,
+              boxes e processed_image_path (null com INFERENCE_ON_WORKER=1, pois
+              o worker não grava a imagem processada); ou os bytes do vetor
+              (octet-stream).
+            - int: Código HTTP (200, 400 ou 500).
+    """
+    try:
+        if "image" not in request.files:
+            return jsonify({"error": "Envie uma imagem no campo 'image'."}), 400
+
+        if INFERENCE_ON_WORKER:
+            result, status = _run_on_worker(process_generate_embeddings, request.files["image"].read())
+        else:
+            result, status = generate_embeddings(request.files["image"])
+        if status != 200:
+            return jsonify(result), status
+
+        mimetype = request.accept_mimetypes.best_match(EMBEDDING_MIMETYPES, default="application/json")
+        if mimetype != "application/json":
+            vector = np.asarray(result["embedding"], dtype="<f4")
+            if mimetype == "application/octet-stream":
+                return Response(vector.tobytes(), mimetype=mimetype, headers={"X-Embedding-Dim": str(vector.size)}), 200
+
+            body = _msgpack_encoder.encode({
+                "embedding": vector.tobytes(),
+                "dtype": "float32",
+                "dim": int(vector.size),
+                "boxes": [[int(v) for v in box] for box in result["boxes"]],
+                "processed_image_path": wait_processed_image(result["processed_image_path"])
+            })
+            return Response(body, mimetype=mimetype), 200
+
+        response = encode_embedding(result["embedding"])
+        response["boxes"] = result["boxes"]
+        #  A gravação da imagem roda em segundo plano: só devolve o caminho já gravado
+        response["processed_image_path"] = wait_processed_image(result["processed_image_path"])
+        return jsonify(response), 200
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
+
+
+# ============================================================
+#  Comparar duas imagens
+# ============================================================
+@embeddings_bp.route("/compare", methods=["POST"])
+def compare():
+    """
+    Compara as faces de duas imagens pela distância euclidiana dos embeddings.
+
+    Request Body (form-data):
+        image1 (file): Primeira imagem.
+        image2 (file): Segunda imagem.
+        threshold (float, optional): Distância máxima para considerar a mesma pessoa. Default 0.7.
+
+    Returns:
+        tuple:
+            - Response (JSON): distance e same_person.
+            - int: Código HTTP (200, 400 ou 500).
+    """
+    try:
+        if "image1" not in request.files or "image2" not in request.files:
+            return jsonify({"error": "Envie as imagens nos campos 'image1' e 'image2'."}), 400
+
+        try:
+            threshold = float(request.form.get("threshold", 0.7))
+        except ValueError:
+            return jsonify({"error": "Campo 'threshold' deve ser numérico."}), 400
+
+        if INFERENCE_ON_WORKER:
+            result, status = _run_on_worker(
+                process_compare_embeddings,
+                request.files["image1"].read(), request.files["image2"].read(), threshold
+            )
+        else:
+            result, status = compare_embeddings(
+                request.files["image1"], request.files["image2"], threshold=threshold
+            )
+        return jsonify(result), status
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
@@ -1,20 +1,311 @@
-from flask import Blueprint, request, jsonify
-from app.services.milvus_service import *
-import boto3
-from io import BytesIO
-import json, traceback, requests
-from redis import Redis
-from app.workers import process_register_face
+from flask import Blueprint, Response, current_app, request, jsonify, make_response, stream_with_context
+from functools import wraps
+from app.services.milvus_service import (
+    get_collection, reset_collection_cache, set_collection_exists,
+    build_expr, COLLECTION_NAME,
+    REGISTERED_EXPR, SUSPECT_EXPR, FACE_EXPR, FacesBatcher, faces_batcher,
+    get_suspect_metadata, invalidate_suspect_metadata, query_faces_by_ids,
+    delete_faces_by_ids, delete_faces_by_suspects, get_field_names
+)
+from app.services.embeddings_service import detect_and_search_faces, wait_processed_image
+from pymilvus import utility
+import time
+import uuid
+import msgspec
+import orjson
+from app.services.redis_service import (
+    redis_conn, redis_wait_conn, job_serializer, get_indexed_suspects, rebuild_suspects_index,
+    begin_suspects_index_rebuild, finish_suspects_index_rebuild,
+    remove_suspect_faces, invalidate_suspects_index, reindex_suspect_faces,
+    suspects_index_ready, iter_indexed_suspects,
+    get_faces_etag_version, bump_faces_version
+)
+from app.services.s3_service import parse_s3_uri
+from app.workers import process_register_face, process_search_face_async_worker, process_search_face_upload
 from rq import Queue
-from rq.job import Job
+from rq.job import Job, JobStatus
+from rq.results import Result
+from rq.exceptions import NoSuchJobError
 
 faces_bp = Blueprint("faces", __name__)
 
-# Configura conexão e fila Redis
-redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-redis_conn = Redis.from_url(redis_url)
-register_queue = Queue("faces_register_queue", connection=redis_conn)
-search_queue = Queue("faces_search_queue", connection=redis_conn)
+# Cache curto das respostas de status de job (absorve rajadas de polling)
+JOB_STATUS_TTL = 0.5
+JOB_STATUS_CACHE_MAX = 4096
+_JOB_STATUS_CACHE = {}
+# Espera máxima (segundos) do long-polling em /jobs/wait/<job_id>
+JOB_WAIT_MAX = 25
+# Estados com resultado gravado no stream de resultados do RQ
+JOB_RESULT_STATUSES = (JobStatus.FINISHED, JobStatus.FAILED)
+# Estados em que o job não muda mais
+JOB_DONE_STATUSES = (JobStatus.FINISHED, JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED)
+
+# Campos devolvidos pelas listagens (restringíveis via ?fields=)
+SUSPECT_FIELDS = ["face_id", "suspect_id", "timestamp", "metadata", "s3_path"]
+FACE_FIELDS = ["face_id", "suspect_id", "is_query", "timestamp", "metadata", "s3_path"]
+
+# Filas Redis (conexão compartilhada em redis_service)
+register_queue = Queue("faces_register_queue", connection=redis_conn, serializer=job_serializer)
+search_queue = Queue("faces_search_queue", connection=redis_conn, serializer=job_serializer)
+
+
+def _format_face(face):
+    """
+    Prepara uma linha retornada pelo Milvus para a resposta: decodifica o
+    campo `metadata` (JSON armazenado como VARCHAR) com orjson e define o
+    campo `source` (s3 | upload). Metadados inválidos são mantidos como string;
+    campos ausentes (não pedidos em `?fields=`) são ignorados.
+    """
+    if "metadata" in face:
+        md = face["metadata"]
+        if md:
+            try:
+                face["metadata"] = orjson.loads(md)
+            except orjson.JSONDecodeError:
+                pass
+        else:
+            face["metadata"] = {}
+    if "s3_path" in face:
+        face["source"] = "s3" if face["s3_path"] else "upload"
+    return face
+
+
+def with_faces_etag(view):
+    """
+    Usa a versão das faces (Redis) como ETag de uma rota de listagem.
+
+    Se o cliente enviar `If-None-Match` com a versão atual, responde 304 sem
+    consultar o Milvus. Sem Redis, ou logo após uma escrita (quando a leitura
+    "Eventually" ainda pode trazer dados anteriores a ela), a rota é servida
+    normalmente, sem ETag.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        version = get_faces_etag_version()
+        if version is None:
+            return view(*args, **kwargs)
+
+        etag = f"faces-{version}"
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return response
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200:
+            response.set_etag(etag)
+        return response
+
+    return wrapper
+
+
+def _fetch_job(job_id):
+    """Busca um job do RQ na conexão Redis compartilhada (None se não existir)."""
+    try:
+        return Job.fetch(job_id, connection=redis_conn, serializer=job_serializer)
+    except NoSuchJobError:
+        return None
+
+
+def _job_status_payload(job_id):
+    """Monta a resposta de `/jobs/status/<job_id>` a partir do job no Redis."""
+    return _job_payload(_fetch_job(job_id))
+
+
+def _job_payload(job):
+    """Monta o status de um job já carregado (None → não encontrado)."""
+    if job is None:
+        return {"error": "Job não encontrado"}, 404
+
+    #  O hash do job já veio inteiro no fetch; só o último resultado exige
+    #  mais uma leitura no Redis
+    status = job.get_status(refresh=False)
+    latest = job.latest_result() if status in JOB_RESULT_STATUSES else None
+    return _job_payload_with_result(job, latest)
+
+
+def _latest_results(jobs):
+    """
+    Lê o último resultado de vários jobs em um único pipeline.
+
+    Um `XREVRANGE rq:results:<id> + - COUNT 1` por job concluído ou com
+    falha, em vez de um `latest_result()` (uma ida ao Redis) por job.
+
+    Returns:
+        dict[str, Result | None]: Último resultado por job_id.
+    """
+    done = [
+        job for job in jobs
+        if job is not None and job.get_status(refresh=False) in JOB_RESULT_STATUSES
+    ]
+    if not done:
+        return {}
+
+    pipe = redis_conn.pipeline(transaction=False)
+    for job in done:
+        pipe.xrevrange(Result.get_key(job.id), "+", "-", count=1)
+
+    latest = {}
+    for job, entries in zip(done, pipe.execute()):
+        if not entries:
+            latest[job.id] = None
+            continue
+        result_id, payload = entries[0]
+        latest[job.id] = Result.restore(
+            job.id, result_id.decode(), payload, connection=redis_conn, serializer=job_serializer
+        )
+    return latest
+
+
+def _job_payload_with_result(job, latest):
+    """Monta o status de um job com o último resultado já lido (None se não houver)."""
+    status = job.get_status(refresh=False)
+    response = {
+        "job_id": job.id,
+        "status": status,
+        "started_at": str(job.started_at) if job.started_at else None,
+        "ended_at": str(job.ended_at) if job.ended_at else None,
+        "error": latest.exc_string if latest and latest.type == Result.Type.FAILED else None
+    }
+
+    # Job ainda executando (ou sem valor de retorno)
+    if latest is None or latest.type != Result.Type.SUCCESSFUL or latest.return_value is None:
+        return response, 200
+
+    raw_result = latest.return_value
+
+    # Caso o worker retorne string (erro interno)
+    if isinstance(raw_result, str):
+        response["error"] = raw_result
+        return response, 500
+
+    # Se o worker retornou algo inválido
+    if not isinstance(raw_result, dict):
+        response["error"] = f"Worker retornou tipo inválido: {type(raw_result).__name__}"
+        response["raw_result"] = str(raw_result)
+        return response, 500
+
+    # Caso normal: devolver exatamente o que o worker retornou
+    response["result"] = raw_result
+    return response, 200
+
+
+def _requested_fields(default):
+    """
+    Lê `?fields=a,b` e devolve os campos de `default` pedidos (face_id sempre incluso).
+
+    Sem o parâmetro, retorna `default`. Campos desconhecidos são ignorados.
+    """
+    raw = request.args.get("fields")
+    if not raw:
+        return list(default)
+    wanted = {f.strip() for f in raw.split(",")}
+    return [f for f in default if f == "face_id" or f in wanted]
+
+
+class RegisterFaceReq(msgspec.Struct):
+    """Corpo de `/faces/register` (JSON ou form-data)."""
+    suspect_id: int | None = None
+    metadata: dict | str | None = None
+    s3_path: str | None = None
+
+
+class UpdateFaceReq(msgspec.Struct):
+    """Corpo de `/faces/update/<face_id>` (JSON ou form-data)."""
+    suspect_id: int | None = None
+    metadata: dict | str | None = None
+
+
+class FaceUpdateItem(msgspec.Struct):
+    """Item de `/faces/update/batch`: a face e as alterações a aplicar."""
+    face_id: int
+    suspect_id: int | None = None
+    metadata: dict | str | None = None
+
+
+class DeleteSuspectsReq(msgspec.Struct):
+    """Corpo de `/faces/delete/suspects`."""
+    suspect_ids: list[int]
+
+
+# Máximo de faces por chamada de `/faces/update/batch`
+MAX_BATCH_UPDATE = 1000
+# Máximo de suspeitos por chamada de `/faces/delete/suspects`
+MAX_BATCH_DELETE = 1000
+
+
+def _decode_body(req_type):
+    """
+    Decodifica e valida o corpo da requisição em um `msgspec.Struct`.
+
+    JSON é decodificado direto dos bytes do corpo; form-data é convertido a
+    partir de `request.form`. Valores como "123" são aceitos para campos int.
+
+    Raises:
+        msgspec.DecodeError: Corpo malformado ou inválido (ValidationError é subclasse).
+    """
+    if request.is_json:
+        return msgspec.json.decode(request.get_data(), type=req_type, strict=False)
+    return msgspec.convert(request.form.to_dict(), type=req_type, strict=False)
+
+
+def _merge_face_update(row, suspect_id, metadata_raw):
+    """
+    Aplica `suspect_id` e o merge de `metadata` sobre a linha completa da face.
+
+    A linha é alterada no lugar (pronta para o upsert); retorna os metadados
+    mesclados já como dict.
+    """
+    if suspect_id is not None:
+        row["suspect_id"] = int(suspect_id)
+
+    try:
+        merged_metadata = orjson.loads(row["metadata"] or "{}")
+    except orjson.JSONDecodeError:
+        merged_metadata = {}
+
+    #  Atualiza o dict recém-decodificado no lugar, sem cópias intermediárias
+    merged_metadata.update(_load_metadata(metadata_raw))
+    row["metadata"] = orjson.dumps(merged_metadata).decode()
+    return merged_metadata
+
+
+def _indexed_row(row):
+    """Linha da face no formato do índice de suspeitos (None para faces de busca)."""
+    if row.get("is_query"):
+        return None
+    return {name: row[name] for name in SUSPECT_FIELDS}
+
+
+def _load_metadata(raw):
+    """
+    Converte o campo `metadata` da requisição em dict usando orjson.
+
+    Aceita dict (corpo JSON) ou string JSON (form-data); strings inválidas
+    são preservadas em {"raw": ...}.
+    """
+    if not raw:
+        return {}
+    if isinstance(raw, dict):
+        return raw
+    try:
+        return orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return {"raw": raw}
+
+
+def _iter_faces(iterator):
+    """Consome um `query_iterator` do Milvus lote a lote, já formatando cada face."""
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            for face in batch:
+                yield _format_face(face)
+    finally:
+        iterator.close()
+
 
 # ============================================================
 #  Rota 1 - Registrar suspeito (imagem associada)
@@ -47,19 +338,19 @@ def register_face():
         Exception: Em caso de erro interno durante processamento ou envio do job.
     """
     try:
-        data = request.get_json(silent=True) or request.form
-        suspect_id = data.get("suspect_id")
-        metadata_raw = data.get("metadata")
-        s3_path = data.get("s3_path")
+        try:
+            req = _decode_body(RegisterFaceReq)
+        except msgspec.DecodeError as e:
+            return jsonify({"error": f"Requisição inválida: {e}"}), 400
+
+        suspect_id = req.suspect_id
+        s3_path = req.s3_path
 
         if not suspect_id:
             return jsonify({"error": "Campo 'suspect_id' é obrigatório."}), 400
 
         #  Metadados opcionais
-        try:
-            metadata = json.loads(metadata_raw) if metadata_raw else {}
-        except Exception:
-            metadata = {"raw": metadata_raw}
+        metadata = _load_metadata(req.metadata)
 
         # =====================================================
         # Caso: Upload local → enviar para a fila (processamento no worker)
@@ -72,7 +363,7 @@ def register_face():
                 suspect_id,
                 None,          # s3_path não usado
                 metadata,
-                image_file.read(),  # enviamos bytes da imagem
+                image_file.read(),  # bytes da imagem (msgpack, sem base64)
                 result_ttl=3600,
                 failure_ttl=3600
             )
@@ -90,7 +381,9 @@ def register_face():
         # Caso: Imagem no S3 (via boto3 + Redis)
         # =====================================================
         elif s3_path:
-            if not s3_path.startswith("s3://"):
+            try:
+                parse_s3_uri(s3_path)
+            except ValueError:
                 return jsonify({"error": "Formato inválido em 's3_path'. Use s3://bucket/key"}), 400
 
             #  Envia tarefa com função real
@@ -118,7 +411,7 @@ def register_face():
             }), 400
 
     except Exception as e:
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -190,11 +483,15 @@ def search_faces():
             - image (FileStorage): imagem enviada diretamente (opcional)
             - s3_path (str): caminho S3 (opcional, formato s3://bucket/key)
             - top_k (int): quantidade de matches retornados pelo Milvus (default: 5)
+            - debug (str): "1" para gravar a imagem com as caixas desenhadas
+              (upload local; sem ele `processed_image_path` vem null)
+            - async (str): "1" para processar o upload no worker (responde 202
+              com `job_id`; resultado via `/jobs/wait/<job_id>`)
 
     Returns:
         Response (Flask JSON):
             - 200: processamento local concluído
-            - 202: job enviado para fila (modo S3)
+            - 202: job enviado para fila (modo S3 ou upload com async=1)
             - 400: requisição inválida (sem image e sem s3_path)
             - 500: erro interno
 
@@ -206,9 +503,6 @@ def search_faces():
           `process_search_face_worker()`.
     """
     try:
-        from app.services.embeddings_service import detect_and_search_faces
-        from app.workers import process_search_face_worker
-
         # Aceita tanto JSON quanto form-data para compatibilidade
         if request.is_json:
             data = request.get_json()
@@ -233,7 +527,26 @@ def search_faces():
         if "image" in request.files:
             image_file = request.files["image"]
 
-            result, status = detect_and_search_faces(image_file, top_k=top_k)
+            #  Com ?async=1 a detecção roda no worker; o resultado sai em /jobs/wait
+            if request.values.get("async") == "1":
+                job = search_queue.enqueue(
+                    process_search_face_upload,
+                    image_file.read(),
+                    top_k,
+                    result_ttl=3600,
+                    failure_ttl=3600
+                )
+
+                return jsonify({
+                    "message": "Upload recebido. Busca enviada ao worker.",
+                    "job_id": job.get_id(),
+                    "status": job.get_status(),
+                    "source": "upload"
+                }), 202
+
+            #  A imagem processada só é gravada em disco quando pedida (debug)
+            save_image = request.values.get("debug") == "1"
+            result, status = detect_and_search_faces(image_file, top_k=top_k, save_image=save_image)
             if status != 200:
                 return jsonify(result), status
 
@@ -241,7 +554,9 @@ def search_faces():
             suspect_metadata = None
             if winner and winner.get("suspect_id") is not None:
                 suspect_metadata = get_suspect_metadata(winner["suspect_id"])
-                print(">>> SUSPECT_METADATA ===>", suspect_metadata)
+
+            #  A gravação (debug) roda em segundo plano: só devolve o caminho já gravado
+            result["processed_image_path"] = wait_processed_image(result["processed_image_path"])
 
             return jsonify({
                 **result,
@@ -256,10 +571,9 @@ def search_faces():
         # 🟡 CASO 2: Busca via S3 — enviar para Redis com callback
         # =====================================================
         if s3_path:
-            import uuid
-            from app.workers import process_search_face_async_worker
-            
-            if not s3_path.startswith("s3://"):
+            try:
+                parse_s3_uri(s3_path)
+            except ValueError:
                 return jsonify({"error": "Formato inválido para 's3_path'. Use s3://bucket/key"}), 400
 
             # Gera requestId único para correlação
@@ -284,7 +598,7 @@ def search_faces():
         return jsonify({"error": "Forneça 'image' ou 's3_path'."}), 400
 
     except Exception as e:
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -293,6 +607,7 @@ def search_faces():
 #  Rota 3 - Listar todos os suspeitos e suas faces
 # ============================================================
 @faces_bp.route("/faces/suspects", methods=["GET"])
+@with_faces_etag
 def list_all_suspects():
     """
     Lista todos os suspeitos cadastrados no Milvus com as faces associadas.
@@ -305,6 +620,12 @@ def list_all_suspects():
         - s3_path
         - source (s3 ou upload)
 
+    Query Params:
+        fields (str, optional): Campos retornados por face, separados por
+            vírgula (ex.: "face_id,suspect_id"). Default: todos.
+        stream (str, optional): "1" para receber NDJSON, uma linha
+            {"suspect_id", "faces"} por suspeito.
+
     Returns:
         tuple:
             - dict: Estrutura contendo suspeitos e suas faces.
@@ -314,39 +635,88 @@ def list_all_suspects():
         Exception: Caso haja erro ao acessar a collection do Milvus.
     """
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-        import json
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
-            return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
-
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        results = collection.query(
-            expr="is_query == false",
-            output_fields=[
-                "face_id", "suspect_id", "timestamp", "metadata", "s3_path"
-            ]
-        )
-
-        suspects = {}
-        for face in results:
-            sid = face["suspect_id"]
-
+        fields = _requested_fields(SUSPECT_FIELDS)
+        if "suspect_id" not in fields:
+            fields.append("suspect_id")
+
+        def project(faces):
+            return [_format_face({k: face[k] for k in fields if k in face}) for face in faces]
+
+        stream = request.args.get("stream") == "1"
+
+        #  Streaming direto do índice: um suspeito por linha, sem montar o dict
+        if stream and suspects_index_ready():
+            def generate_indexed():
+                for sid, faces in iter_indexed_suspects():
+                    yield orjson.dumps({"suspect_id": sid, "faces": project(faces)}) + b"\n"
+
+            return Response(stream_with_context(generate_indexed()), mimetype="application/x-ndjson")
+
+        #  Caminho rápido: índice de suspeitos mantido no Redis
+        suspects = get_indexed_suspects()
+
+        if suspects is not None:
+            for sid, faces in suspects.items():
+                suspects[sid] = project(faces)
+        elif fields != SUSPECT_FIELDS:
+            #  Visão reduzida: consulta só os campos pedidos, sem reconstruir o índice
+            collection = get_collection()
+            if collection is None:
+                return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
+
+            suspects = {}
+            for face in _iter_faces(collection.query_iterator(
+                batch_size=500,
+                expr=REGISTERED_EXPR,
+                output_fields=fields,
+                consistency_level="Eventually"
+            )):
+                suspects.setdefault(face["suspect_id"], []).append(face)
+        else:
+            #  Redis frio: varre o Milvus e reconstrói o índice
+            collection = get_collection()
+            if collection is None:
+                return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
+
+            #  Varre em lotes: índice e agrupamento são montados incrementalmente.
+            #  Leitura Strong (a reconstrução é rara): o índice não pode nascer
+            #  com linhas anteriores a uma escrita já confirmada. Só quem obtém
+            #  o token da reconstrução escreve no índice; as demais listagens
+            #  concorrentes servem a própria varredura
+            rebuild = begin_suspects_index_rebuild()
+            suspects = {}
+            scanned = False
             try:
-                face["metadata"] = json.loads(face["metadata"])
-            except Exception:
-                pass
-
-            face["source"] = "s3" if face.get("s3_path") else "upload"
-
-            if sid not in suspects:
-                suspects[sid] = []
-            suspects[sid].append(face)
+                iterator = collection.query_iterator(
+                    batch_size=500,
+                    expr=REGISTERED_EXPR,
+                    output_fields=SUSPECT_FIELDS,
+                    consistency_level="Strong"
+                )
+                try:
+                    while True:
+                        batch = iterator.next()
+                        if not batch:
+                            break
+                        if rebuild is not None:
+                            rebuild_suspects_index(batch, complete=False)
+
+                        for face in batch:
+                            suspects.setdefault(face["suspect_id"], []).append(_format_face(face))
+                finally:
+                    iterator.close()
+                scanned = True
+            finally:
+                #  Completo só se a varredura terminou, o token ainda é desta
+                #  reconstrução e nenhuma escrita ocorreu durante ela
+                finish_suspects_index_rebuild(rebuild, complete=scanned)
+
+        if stream:
+            def generate():
+                for sid, faces in suspects.items():
+                    yield orjson.dumps({"suspect_id": sid, "faces": faces}) + b"\n"
+
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
 
         return jsonify({
             "total_suspects": len(suspects),
@@ -357,8 +727,7 @@ def list_all_suspects():
         }), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
     
 
@@ -367,6 +736,7 @@ def list_all_suspects():
 #  Rota 4 - Listar todas as faces de um suspeito específico
 # ============================================================
 @faces_bp.route("/faces/suspects/<int:suspect_id>", methods=["GET"])
+@with_faces_etag
 def list_faces_by_suspect(suspect_id):
     """
     Lista todas as faces associadas a um suspeito específico.
@@ -374,6 +744,9 @@ def list_faces_by_suspect(suspect_id):
     Args:
         suspect_id (int): ID do suspeito consultado.
 
+    Query Params:
+        fields (str, optional): Campos retornados por face, separados por vírgula.
+
     Returns:
         tuple:
             - dict: Detalhes das faces encontradas, incluindo:
@@ -388,24 +761,11 @@ def list_faces_by_suspect(suspect_id):
         Exception: Em caso de falhas de acesso ao banco vetorial (Milvus).
     """
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-        import json
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
+        #  Consultas simultâneas são agrupadas em uma única query no Milvus
+        results = faces_batcher.get(suspect_id, _requested_fields(FacesBatcher.OUTPUT_FIELDS))
+        if results is None:
             return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        expr = f"is_query == false and suspect_id == {suspect_id}"
-        results = collection.query(
-            expr=expr,
-            output_fields=["face_id", "timestamp", "metadata", "s3_path"]
-        )
-
         if not results:
             return jsonify({
                 "suspect_id": suspect_id,
@@ -414,11 +774,7 @@ def list_faces_by_suspect(suspect_id):
             }), 404
 
         for r in results:
-            try:
-                r["metadata"] = json.loads(r["metadata"])
-            except Exception:
-                pass
-            r["source"] = "s3" if r.get("s3_path") else "upload"
+            _format_face(r)
 
         return jsonify({
             "suspect_id": suspect_id,
@@ -427,8 +783,7 @@ def list_faces_by_suspect(suspect_id):
         }), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -436,12 +791,18 @@ def list_faces_by_suspect(suspect_id):
 #  Rota 5 - Listar todos os embeddings cadastrados
 # ============================================================
 @faces_bp.route("/faces/all", methods=["GET"])
+@with_faces_etag
 def list_all_faces():
     """
     Lista todas as faces cadastradas no Milvus, incluindo suspeitos e buscas.
 
     Query Params:
         limit (int, optional): Máximo de registros retornados. Default = 1000.
+        offset (int, optional): Registros pulados antes do primeiro retornado
+            (paginação com `limit`). Default = 0.
+        stream (str, optional): "1" para receber NDJSON (uma face por linha),
+            enviado à medida que os lotes chegam do Milvus.
+        fields (str, optional): Campos retornados por face, separados por vírgula.
 
     Cada item retorna:
         - face_id
@@ -453,53 +814,54 @@ def list_all_faces():
         - source (s3 | upload)
 
     Returns:
-        tuple:
-            - dict: Estrutura contendo todas as faces.
-            - int: Código de status HTTP.
+        Response: JSON {"offset", "faces", "total_faces"} enviado em partes
+        (chunked) à medida que os lotes chegam do Milvus.
 
     Raises:
         Exception: Em caso de falha ao acessar Milvus.
     """
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-        import json
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
+        collection = get_collection()
+        if collection is None:
             return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
         limit = int(request.args.get("limit", 1000))
-
-        results = collection.query(
-            expr="",
+        if limit <= 0:
+            return jsonify({"error": "Parâmetro 'limit' deve ser positivo."}), 400
+        offset = int(request.args.get("offset", 0))
+        if offset < 0:
+            return jsonify({"error": "Parâmetro 'offset' não pode ser negativo."}), 400
+        stream = request.args.get("stream") == "1"
+
+        #  Pagina no servidor em lotes, sem materializar tudo em uma só RPC
+        iterator = collection.query_iterator(
+            batch_size=min(500, limit),
             limit=limit,
-            output_fields=[
-                "face_id", "suspect_id", "is_query",
-                "timestamp", "metadata", "s3_path"
-            ]
+            offset=offset,
+            output_fields=_requested_fields(FACE_FIELDS),
+            consistency_level="Eventually"
         )
 
-        #  Processa metadados e define o campo "source"
-        for r in results:
-            try:
-                r["metadata"] = json.loads(r["metadata"])
-            except Exception:
-                pass
-            r["source"] = "s3" if r.get("s3_path") else "upload"
+        if stream:
+            def generate():
+                for face in _iter_faces(iterator):
+                    yield orjson.dumps(face) + b"\n"
 
-        return jsonify({
-            "total_faces": len(results),
-            "faces": results
-        }), 200
+            return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+        #  JSON montado em partes: memória limitada a um lote, sem buffer do payload inteiro
+        def generate_json():
+            total = 0
+            yield b'{"offset":%d,"faces":[' % offset
+            for face in _iter_faces(iterator):
+                yield (b"," if total else b"") + orjson.dumps(face)
+                total += 1
+            yield b'],"total_faces":%d}' % total
+
+        return Response(stream_with_context(generate_json()), mimetype="application/json")
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -524,19 +886,21 @@ def delete_face(face_id):
         Exception: Em caso de erro no acesso ao Milvus ou remoção.
     """ 
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
+        collection = get_collection()
+        if collection is None:
             return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
+        #  suspect_id da face antes de remover: só o campo dela sai do índice
+        owners = query_faces_by_ids(collection, [face_id], ["suspect_id"])
 
-        expr = f"face_id == {face_id}"
+        expr = build_expr(FACE_EXPR, fid=face_id)
         delete_result = collection.delete(expr)
+        #  Versão antes do índice: uma reconstrução concorrente não se marca completa
+        bump_faces_version()
+        if owners:
+            suspect_id = owners[0]["suspect_id"]
+            reindex_suspect_faces(removed=[(suspect_id, face_id)])
+            invalidate_suspect_metadata(suspect_id)
 
         return jsonify({
             "message": f"Face com ID {face_id} removida (se existente).",
@@ -544,8 +908,7 @@ def delete_face(face_id):
         }), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -568,20 +931,19 @@ def clear_collection():
         Exception: Caso ocorra falha durante a operação no Milvus.
     """
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import utility
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
+        if get_collection() is None:
             return jsonify({"message": "Collection já inexistente."}), 200
 
         utility.drop_collection(COLLECTION_NAME)
+        reset_collection_cache()
+        set_collection_exists(False)
+        bump_faces_version()
+        invalidate_suspects_index()
+        invalidate_suspect_metadata()
         return jsonify({"message": f"Collection '{COLLECTION_NAME}' removida com sucesso."}), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -605,93 +967,56 @@ def update_face(face_id):
         suspect_id (int, optional): Novo ID do suspeito.
         metadata (str, optional): JSON de metadados a serem mesclados.
 
+    Query Params:
+        flush (str, optional): "1" para forçar `collection.flush()` após o upsert.
+
     Returns:
         tuple:
             - dict: Dados atualizados.
             - int: Código HTTP.
 
     Raises:
-        Exception: Caso não encontre a face ou falhe na reinserção.
+        Exception: Caso não encontre a face ou falhe no upsert.
     """
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-        import json
-
-        data = request.get_json(silent=True) or request.form
-        new_suspect_id = data.get("suspect_id")
-        metadata_raw = data.get("metadata")
-
-        connect_milvus()
+        try:
+            req = _decode_body(UpdateFaceReq)
+        except msgspec.DecodeError as e:
+            return jsonify({"error": f"Requisição inválida: {e}"}), 400
 
-        if not utility.has_collection(COLLECTION_NAME):
+        collection = get_collection()
+        if collection is None:
             return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        #  Busca os dados existentes (sem embedding)
-        existing = collection.query(
-            expr=f"face_id == {face_id}",
-            output_fields=[
-                "face_id", "suspect_id", "timestamp",
-                "is_query", "metadata", "s3_path"
-            ]
-        )
+        #  Busca a linha completa (todos os campos do schema, inclusive o embedding)
+        fields = get_field_names(collection)
+        existing = query_faces_by_ids(collection, [face_id], list(fields))
 
         if not existing:
             return jsonify({"error": f"Face ID {face_id} não encontrada."}), 404
 
         current = existing[0]
-
-        #  Busca o embedding separadamente
-        emb_result = collection.query(
-            expr=f"face_id == {face_id}",
-            output_fields=["embedding"]
-        )
-        if not emb_result or "embedding" not in emb_result[0]:
+        if "embedding" not in current:
             return jsonify({"error": "Não foi possível recuperar o embedding da face."}), 500
 
-        embedding = emb_result[0]["embedding"]
-
-        #  Determina novos valores
-        updated_suspect_id = int(new_suspect_id) if new_suspect_id is not None else current["suspect_id"]
-
-        #  Merge de metadados
-        try:
-            new_metadata = json.loads(metadata_raw) if metadata_raw else {}
-        except Exception:
-            new_metadata = {"raw": metadata_raw}
-
-        try:
-            old_metadata = json.loads(current["metadata"])
-        except Exception:
-            old_metadata = {}
-
-        merged_metadata = {**old_metadata, **new_metadata}
+        #  Novo suspect_id e merge de metadados sobre a linha completa
+        row = {name: current[name] for name in fields}
+        merged_metadata = _merge_face_update(row, req.suspect_id, req.metadata)
+        updated_suspect_id = row["suspect_id"]
 
         # ============================================================
-        #  Deleta o registro antigo
+        #  Upsert: substitui o registro com os novos dados em uma única RPC
         # ============================================================
-        collection.delete(expr=f"face_id == {face_id}")
-        collection.flush()
-
-        # ============================================================
-        #  Reinsere com os novos dados
-        # ============================================================
-        data_insert = [
-            [face_id],
-            [updated_suspect_id],
-            [embedding],
-            [current.get("timestamp", 0)],
-            [current.get("is_query", False)],
-            [json.dumps(merged_metadata)],
-            [current.get("s3_path", "")]
-        ]
-
-        collection.insert(data_insert)
-        collection.flush()
-        collection.load()
+        collection.upsert([row])
+        if request.args.get("flush") == "1":
+            collection.flush()
+        bump_faces_version()
+        indexed = _indexed_row(row)
+        reindex_suspect_faces(
+            removed=[(current["suspect_id"], face_id)],
+            added=[indexed] if indexed else []
+        )
+        invalidate_suspect_metadata(current["suspect_id"], updated_suspect_id)
 
         return jsonify({
             "message": f"Face {face_id} atualizada com sucesso.",
@@ -701,8 +1026,7 @@ def update_face(face_id):
         }), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -714,53 +1038,64 @@ def delete_faces_by_suspect(suspect_id):
     """
     Remove todas as faces associadas a um suspeito específico.
 
+    A remoção já é visível para as consultas seguintes sem `flush()`; o selo
+    dos segmentos fica com a compactação do Milvus.
+
     Args:
         suspect_id (int): ID do suspeito alvo.
 
+    Query Params:
+        flush (str, optional): "1" para forçar `collection.flush()` após a remoção.
+        return_ids (str, optional): "1" para devolver os `face_id` removidos em `deleted_faces`
+            (uma consulta extra; a remoção passa a ser pela chave primária).
+
     Returns:
         tuple:
-            - dict: IDs removidos e quantidade total.
+            - dict: Quantidade de faces removidas (e seus IDs, se pedidos).
             - int: Código HTTP.
 
     Raises:
         Exception: Em falhas durante a operação no Milvus.
     """ 
     try:
-        from app.services.milvus_service import connect_milvus, COLLECTION_NAME
-        from pymilvus import Collection, utility
-
-        connect_milvus()
-
-        if not utility.has_collection(COLLECTION_NAME):
+        collection = get_collection()
+        if collection is None:
             return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
 
-        collection = Collection(COLLECTION_NAME)
-        collection.load()
-
-        #  Verifica se há registros do suspeito
-        existing = collection.query(
-            expr=f"suspect_id == {suspect_id}",
-            output_fields=["face_id"]
-        )
+        face_ids = None
+        if request.args.get("return_ids") == "1":
+            #  IDs pedidos: uma consulta pelo suspeito e remoção pela chave primária
+            face_ids = [r["face_id"] for r in collection.query(
+                expr=build_expr(SUSPECT_EXPR, sid=suspect_id),
+                output_fields=["face_id"]
+            )]
+            total_deleted = delete_faces_by_ids(collection, face_ids) if face_ids else 0
+        else:
+            #  Remove direto pelo filtro; o Milvus informa quantas linhas apagou
+            total_deleted = collection.delete(expr=build_expr(SUSPECT_EXPR, sid=suspect_id)).delete_count
 
-        if not existing:
+        if not total_deleted:
             return jsonify({
                 "message": f"Nenhuma face encontrada para suspect_id {suspect_id}."
             }), 404
 
-        face_ids = [f["face_id"] for f in existing]
-        collection.delete(expr=f"suspect_id == {suspect_id}")
-        collection.flush()
+        bump_faces_version()
+        remove_suspect_faces(suspect_id)
+        invalidate_suspect_metadata(suspect_id)
+        if request.args.get("flush") == "1":
+            collection.flush()
 
-        return jsonify({
+        response = {
             "message": f"Todas as faces associadas ao suspect_id {suspect_id} foram removidas.",
-            "deleted_faces": face_ids,
-            "total_deleted": len(face_ids)
-        }), 200
+            "total_deleted": total_deleted
+        }
+        if face_ids is not None:
+            response["deleted_faces"] = face_ids
+
+        return jsonify(response), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
 
@@ -829,55 +1164,292 @@ def get_job_status(job_id):
           tarefas assíncronas como registro e busca facial.
     """
     try:
-        from redis import Redis
-        from rq.job import Job
-        import os
+        #  Polls repetidos dentro de JOB_STATUS_TTL reaproveitam a última leitura
+        now = time.monotonic()
+        cached = _JOB_STATUS_CACHE.get(job_id)
+        if cached and cached[2] > now:
+            return jsonify(cached[0]), cached[1]
 
-        redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
-        redis_conn = Redis.from_url(redis_url)
+        payload, status = _job_status_payload(job_id)
 
-        # Buscar o job nas filas
-        job = None
-        for queue_name in ["faces_register_queue", "faces_search_queue"]:
-            try:
-                job = Job.fetch(job_id, connection=redis_conn)
-                break
-            except:
-                pass
+        if len(_JOB_STATUS_CACHE) >= JOB_STATUS_CACHE_MAX:
+            _JOB_STATUS_CACHE.clear()
+        _JOB_STATUS_CACHE[job_id] = (payload, status, now + JOB_STATUS_TTL)
+        return jsonify(payload), status
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
+
+
+# ============================================================
+#  Rota 11 - Recarregar a collection (administrativa)
+# ============================================================
+@faces_bp.route("/faces/reload", methods=["POST"])
+def reload_collection():
+    """
+    Descarta o handle em cache e recarrega a collection 'faces' no Milvus.
+
+    As rotas nunca chamam `load()`; a collection é carregada uma única vez na
+    subida (ou no primeiro acesso). Este endpoint força uma nova conexão e um
+    novo `load()`, ex.: após restaurar a collection ou reiniciar o Milvus.
+
+    Returns:
+        tuple:
+            - dict: Mensagem de confirmação.
+            - int: Código HTTP (200, 404 ou 500).
+    """
+    try:
+        reset_collection_cache()
+        if get_collection() is None:
+            return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
+
+        return jsonify({"message": f"Collection '{COLLECTION_NAME}' recarregada com sucesso."}), 200
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
+
+
+# ============================================================
+#  Rota 12 - Status de vários jobs em uma chamada
+# ============================================================
+@faces_bp.route("/jobs/status/batch", methods=["POST"])
+def get_jobs_status_batch():
+    """
+    Consulta o status de vários jobs com duas idas ao Redis: uma para os
+    hashes dos jobs e outra (pipeline) para os últimos resultados.
+
+    Request Body (JSON):
+        job_ids (list[str]): IDs dos jobs (máx. 1000).
+
+    Returns:
+        Response (NDJSON): Uma linha por job, na ordem pedida, com o mesmo
+        conteúdo de `/jobs/status/<job_id>` acrescido de `http_status`.
+        Jobs inexistentes vêm como {"job_id", "error", "http_status": 404}.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        job_ids = data.get("job_ids")
+        if not isinstance(job_ids, list) or not all(isinstance(j, str) for j in job_ids):
+            return jsonify({"error": "Campo 'job_ids' deve ser uma lista de strings."}), 400
+        if len(job_ids) > 1000:
+            return jsonify({"error": "Máximo de 1000 jobs por requisição."}), 400
+
+        #  Hashes dos jobs e últimos resultados: um pipeline cada
+        jobs = Job.fetch_many(job_ids, connection=redis_conn, serializer=job_serializer)
+        latest = _latest_results(jobs)
+
+        def generate():
+            for job_id, job in zip(job_ids, jobs):
+                if job is None:
+                    payload, status = _job_payload(None)
+                else:
+                    payload, status = _job_payload_with_result(job, latest.get(job.id))
+                payload.setdefault("job_id", job_id)
+                payload["http_status"] = status
+                yield orjson.dumps(payload, default=str) + b"\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
-        if job is None:
+
+# ============================================================
+#  Rota 13 - Aguardar a conclusão de um job (long-polling)
+# ============================================================
+@faces_bp.route("/jobs/wait/<job_id>", methods=["GET"])
+def wait_job(job_id):
+    """
+    Aguarda a conclusão de um job e retorna o mesmo conteúdo de `/jobs/status/<job_id>`.
+
+    Substitui o polling periódico: a requisição fica bloqueada no stream de
+    resultados do RQ (XREAD) e responde assim que o worker grava o resultado,
+    ou ao fim do timeout com o status atual.
+
+    Args:
+        job_id (str): ID do job gerado pelo RQ.
+
+    Query Params:
+        timeout (int, optional): Espera máxima em segundos (1 a 25). Default = 25.
+
+    Returns:
+        tuple:
+            - dict: Status do job (e resultado, se concluído).
+            - int: Código HTTP (200, 400, 404 ou 500).
+    """
+    try:
+        try:
+            timeout = min(max(int(request.args.get("timeout", JOB_WAIT_MAX)), 1), JOB_WAIT_MAX)
+        except ValueError:
+            return jsonify({"error": "Parâmetro 'timeout' deve ser um número inteiro."}), 400
+
+        try:
+            job = Job.fetch(job_id, connection=redis_wait_conn, serializer=job_serializer)
+        except NoSuchJobError:
             return jsonify({"error": "Job não encontrado"}), 404
 
-        response = {
-            "job_id": job.id,
-            "status": job.get_status(),
-            "started_at": str(job.started_at) if job.started_at else None,
-            "ended_at": str(job.ended_at) if job.ended_at else None,
-            "error": str(job.exc_info) if job.is_failed and job.exc_info else None
+        if job.get_status(refresh=False) not in JOB_DONE_STATUSES:
+            #  Bloqueia até o worker publicar o resultado no stream do job
+            if job.latest_result(timeout=timeout) is not None:
+                job.refresh()
+
+        payload, status = _job_payload(job)
+        return jsonify(payload), status
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
+
+
+# ============================================================
+#  Rota 14 - Editar várias faces em uma chamada
+# ============================================================
+@faces_bp.route("/faces/update/batch", methods=["PUT"])
+def update_faces_batch():
+    """
+    Atualiza várias faces com uma consulta e um upsert no Milvus.
+
+    Cada item segue as regras de `/faces/update/<face_id>`; itens repetidos
+    para a mesma face são aplicados em ordem.
+
+    Request Body (JSON):
+        Lista de {"face_id": int, "suspect_id": int (opcional),
+        "metadata": dict | str (opcional)} com no máximo 1000 itens.
+
+    Query Params:
+        flush (str, optional): "1" para forçar `collection.flush()` após o upsert.
+
+    Returns:
+        tuple:
+            - dict: Faces atualizadas e IDs não encontrados.
+            - int: Código HTTP (200, 400, 404 ou 500).
+    """
+    try:
+        try:
+            items = msgspec.json.decode(request.get_data(), type=list[FaceUpdateItem], strict=False)
+        except msgspec.DecodeError as e:
+            return jsonify({"error": f"Requisição inválida: {e}"}), 400
+
+        if not items:
+            return jsonify({"error": "Envie ao menos uma face para atualizar."}), 400
+        if len(items) > MAX_BATCH_UPDATE:
+            return jsonify({"error": f"Máximo de {MAX_BATCH_UPDATE} faces por requisição."}), 400
+
+        collection = get_collection()
+        if collection is None:
+            return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
+
+        #  Uma consulta `face_id in [...]` para todas as linhas completas
+        fields = get_field_names(collection)
+        rows = {
+            face["face_id"]: {name: face[name] for name in fields}
+            for face in query_faces_by_ids(collection, [item.face_id for item in items], list(fields))
         }
+        if any("embedding" not in row for row in rows.values()):
+            return jsonify({"error": "Não foi possível recuperar o embedding das faces."}), 500
+
+        original_suspects = {face_id: row["suspect_id"] for face_id, row in rows.items()}
+        updated = {}
+        not_found = []
+
+        for item in items:
+            row = rows.get(item.face_id)
+            if row is None:
+                not_found.append(item.face_id)
+                continue
+            updated[item.face_id] = _merge_face_update(row, item.suspect_id, item.metadata)
+
+        if not updated:
+            return jsonify({"error": "Nenhuma das faces foi encontrada.", "not_found": not_found}), 404
+
+        #  Um único upsert com todas as linhas alteradas
+        collection.upsert([rows[face_id] for face_id in updated])
+        if request.args.get("flush") == "1":
+            collection.flush()
+
+        bump_faces_version()
+        indexed = [_indexed_row(rows[face_id]) for face_id in updated]
+        reindex_suspect_faces(
+            removed=[(original_suspects[face_id], face_id) for face_id in updated],
+            added=[row for row in indexed if row]
+        )
+        touched_suspects = set(original_suspects.values())
+        touched_suspects.update(rows[face_id]["suspect_id"] for face_id in updated)
+        invalidate_suspect_metadata(*touched_suspects)
 
-        # Job ainda executando
-        if job.result is None:
-            return jsonify(response), 200
+        return jsonify({
+            "message": f"{len(updated)} face(s) atualizada(s) com sucesso.",
+            "faces": [
+                {"face_id": face_id, "suspect_id": rows[face_id]["suspect_id"], "metadata": metadata}
+                for face_id, metadata in updated.items()
+            ],
+            "not_found": not_found
+        }), 200
+
+    except Exception as e:
+        current_app.logger.exception("error in %s", request.path)
+        return jsonify({"error": f"Erro interno: {str(e)}"}), 500
 
-        raw_result = job.result
 
-        # Caso o worker retorne string (erro interno)
-        if isinstance(raw_result, str):
-            response["error"] = raw_result
-            return jsonify(response), 500
+# ============================================================
+#  Rota 15 - Remove as faces de vários suspeitos em uma chamada
+# ============================================================
+@faces_bp.route("/faces/delete/suspects", methods=["DELETE"])
+def delete_faces_by_suspects_batch():
+    """
+    Remove todas as faces de vários suspeitos com um filtro `suspect_id in [...]`.
 
-        # Se o worker retornou algo inválido
-        if not isinstance(raw_result, dict):
-            response["error"] = f"Worker retornou tipo inválido: {type(raw_result).__name__}"
-            response["raw_result"] = str(raw_result)
-            return jsonify(response), 500
+    Uma única remoção no Milvus (por bloco de até `MAX_IN_LIST` IDs) em vez de
+    uma chamada de `/faces/delete/suspect/<suspect_id>` por suspeito.
 
-        # Caso normal: devolver exatamente o que o worker retornou
-        response["result"] = raw_result
-        return jsonify(response), 200
+    Request Body (JSON):
+        suspect_ids (list[int]): IDs dos suspeitos (no máximo 1000).
+
+    Query Params:
+        flush (str, optional): "1" para forçar `collection.flush()` após a remoção.
+
+    Returns:
+        tuple:
+            - dict: Quantidade de faces removidas.
+            - int: Código HTTP (200, 400, 404 ou 500).
+    """
+    try:
+        try:
+            req = msgspec.json.decode(request.get_data(), type=DeleteSuspectsReq, strict=False)
+        except msgspec.DecodeError as e:
+            return jsonify({"error": f"Requisição inválida: {e}"}), 400
+
+        suspect_ids = list(dict.fromkeys(req.suspect_ids))
+        if not suspect_ids:
+            return jsonify({"error": "Envie ao menos um suspect_id."}), 400
+        if len(suspect_ids) > MAX_BATCH_DELETE:
+            return jsonify({"error": f"Máximo de {MAX_BATCH_DELETE} suspeitos por requisição."}), 400
+
+        collection = get_collection()
+        if collection is None:
+            return jsonify({"error": f"Collection '{COLLECTION_NAME}' não existe."}), 404
+
+        total_deleted = delete_faces_by_suspects(collection, suspect_ids)
+        if not total_deleted:
+            return jsonify({
+                "message": "Nenhuma face encontrada para os suspect_ids informados."
+            }), 404
+
+        bump_faces_version()
+        remove_suspect_faces(*suspect_ids)
+        invalidate_suspect_metadata(*suspect_ids)
+        if request.args.get("flush") == "1":
+            collection.flush()
+
+        return jsonify({
+            "message": f"Faces de {len(suspect_ids)} suspeito(s) removidas.",
+            "suspect_ids": suspect_ids,
+            "total_deleted": total_deleted
+        }), 200
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception("error in %s", request.path)
         return jsonify({"error": f"Erro interno: {str(e)}"}), 500
@@ -1,54 +1,382 @@
+import atexit
+import base64
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cv2
 import numpy as np
 from PIL import Image
-from numpy.linalg import norm
+from app.services.milvus_service import search_similar_faces_batch
+from app.services.redis_service import get_cached_detections, cache_detections
 from models.facenet import get_facenet_model
 
+# Lado maior mínimo (px) preservado na decodificação reduzida de JPEGs grandes
+MAX_DECODE_SIZE = 1600
 
-def generate_embeddings(image_file):
-    try:
-        import os
-        import cv2
-        from PIL import Image
-        import numpy as np
+# Cache LRU em processo das detecções, indexado pelo hash do conteúdo da imagem
+# (à frente do cache compartilhado no Redis)
+DETECTIONS_CACHE_MAX = 256
+_DETECTIONS_CACHE = OrderedDict()
+_detections_lock = threading.Lock()
+
+# Gravação das imagens processadas fora da thread da requisição (encode JPEG +
+# escrita em disco); `_PENDING_SAVES` guarda as gravações ainda em andamento
+# (e as que falharam, até alguém aguardá-las)
+JPEG_QUALITY = 85
+# Espera máxima (segundos) pela gravação antes de devolver o caminho ao cliente
+PROCESSED_IMAGE_WAIT = 10
+_IO_POOL = ThreadPoolExecutor(max_workers=2)
+atexit.register(_IO_POOL.shutdown)
+_PENDING_SAVES = {}
+_saves_lock = threading.Lock()
+
+
+def sniff_image(header):
+    """
+    Identifica o formato da imagem pelos bytes iniciais (magic bytes).
+
+    Usado antes da detecção/embedding para descartar de imediato objetos que
+    não são imagens (chave errada, página de erro HTML, arquivo vazio).
+
+    Args:
+        header (bytes): Primeiros bytes do arquivo (16 bastam).
+
+    Returns:
+        str | None: "jpeg", "png" ou "webp"; None se não for um formato suportado.
+    """
+    if header[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def encode_embedding(embedding):
+    """
+    Serializa um embedding como float32 little-endian em base64.
+
+    Bem mais compacto (~3x) e barato de gerar do que uma lista JSON de floats.
+    No cliente: `np.frombuffer(base64.b64decode(s), dtype="<f4")`.
+
+    Args:
+        embedding (list[float] | np.ndarray): Vetor de características.
+
+    Returns:
+        dict: {"embedding_b64": str, "dtype": "float32", "dim": int}
+    """
+    vector = np.asarray(embedding, dtype="<f4")
+    return {
+        "embedding_b64": base64.b64encode(vector.tobytes()).decode(),
+        "dtype": "float32",
+        "dim": int(vector.size)
+    }
+
+
+def decode_embedding(value):
+    """
+    Converte um embedding em lista/ndarray ou em base64 (ver `encode_embedding`)
+    para um `np.ndarray` float32.
+    """
+    if isinstance(value, (str, bytes)):
+        return np.frombuffer(base64.b64decode(value), dtype="<f4")
+    return np.ascontiguousarray(value, dtype=np.float32)
+
+
+def _decode_image(data):
+    """
+    Decodifica os bytes da imagem direto para um ndarray RGB (uint8).
 
+    O `cv2.imdecode` escreve em um buffer numpy sem objetos PIL intermediários;
+    o PIL só lê o cabeçalho (formato/tamanho) e fica como fallback para
+    formatos que o OpenCV não decodifica. A orientação EXIF é ignorada, como
+    no caminho PIL.
+
+    Returns:
+        tuple:
+            - np.ndarray: Imagem RGB (uint8), possivelmente reduzida.
+            - int: Fator de redução (1, 2, 4 ou 8); coordenadas na imagem
+              decodificada vezes o fator = coordenadas na imagem original.
+    """
+    image = Image.open(io.BytesIO(data))
+
+    scale = 1
+    flags = cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION
+    if image.format == "JPEG":
+        # Maior redução do libjpeg que mantém o lado maior >= MAX_DECODE_SIZE
+        for factor, reduced in ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                                (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                (2, cv2.IMREAD_REDUCED_COLOR_2)):
+            if max(image.size) / factor >= MAX_DECODE_SIZE:
+                scale = factor
+                flags = reduced | cv2.IMREAD_IGNORE_ORIENTATION
+                break
+
+    image_np = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flags)
+    if image_np is not None:
+        # BGR -> RGB no próprio buffer
+        return cv2.cvtColor(image_np, cv2.COLOR_BGR2RGB, dst=image_np), scale
+
+    return np.array(image.convert("RGB"), dtype=np.uint8), 1
+
+
+def _scale_detections(detections, scale):
+    """Leva as caixas da imagem decodificada (reduzida) para a imagem original."""
+    if scale == 1:
+        return detections
+    return [{**det, "box": [int(v) * scale for v in det["box"]]} for det in detections]
+
+
+def extract_faces(image_file):
+    """
+    Decodifica a imagem e extrai rostos (caixas + embeddings) com o FaceNet.
+
+    Imagens idênticas (reenvios, retries de clientes) não passam de novo pela
+    rede: as detecções ficam em um cache LRU chaveado pelo blake2b dos bytes e,
+    entre processos (API e workers), no Redis com a mesma chave.
+
+    JPEGs maiores que `MAX_DECODE_SIZE` são decodificados já reduzidos (escala
+    1/2, 1/4 ou 1/8 do próprio libjpeg); as caixas são devolvidas (e guardadas
+    em cache) nas coordenadas da imagem original, e o fator de redução
+    acompanha a imagem para o desenho das caixas.
+
+    Args:
+        image_file (file-like): Imagem enviada ou baixada do S3.
+
+    Returns:
+        tuple:
+            - np.ndarray: Imagem RGB (uint8), possivelmente reduzida.
+            - list[dict]: Detecções do modelo ({"box", "embedding", ...}), com
+              caixas em coordenadas da imagem original.
+            - int: Fator de redução da imagem decodificada (1, 2, 4 ou 8).
+    """
+    return extract_faces_batch([image_file])[0]
+
+
+def extract_faces_batch(image_files):
+    """
+    Versão em lote de `extract_faces` (ex.: as duas imagens de `/compare`).
+
+    A detecção (MTCNN) continua por imagem, mas os rostos recortados de todas
+    as imagens fora do cache passam por uma única inferência do FaceNet
+    (`model.embeddings`), em vez de uma chamada do modelo por imagem. Imagens
+    repetidas no lote são processadas uma vez.
+
+    Args:
+        image_files (list[file-like]): Imagens enviadas ou baixadas do S3.
+
+    Returns:
+        list[tuple]: (imagem RGB uint8, detecções, fator de redução) na ordem recebida.
+    """
+    results = []
+    misses = {}
+    scales = {}
+    for image_file in image_files:
+        data = image_file.read()
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        image_np, scale = _decode_image(data)
+        detections = _lookup_detections(digest)
+        if detections is None:
+            misses.setdefault(digest, image_np)
+            scales[digest] = scale
+        results.append((digest, image_np, scale, detections))
+
+    if misses:
         # LOAD DO MODELO SOMENTE QUANDO O WORKER CHAMAR
         model = get_facenet_model()
+        if len(misses) == 1:
+            computed = {digest: model.extract(image_np, threshold=0.95) for digest, image_np in misses.items()}
+        else:
+            computed = _extract_many(model, misses)
+
+        for digest, detections in computed.items():
+            # cache em coordenadas da imagem original (independe da redução)
+            detections = computed[digest] = _scale_detections(detections, scales[digest])
+            cache_detections(digest, detections)
+            _remember_detections(digest, detections)
+
+        results = [
+            (digest, image_np, scale, computed[digest] if detections is None else detections)
+            for digest, image_np, scale, detections in results
+        ]
+
+    return [(image_np, detections, scale) for _, image_np, scale, detections in results]
+
+
+def _extract_many(model, images):
+    """Detecta por imagem e calcula os embeddings de todos os rostos em uma inferência."""
+    detected = {digest: model.crop(image_np, threshold=0.95) for digest, image_np in images.items()}
+    crops = [crop for _, image_crops in detected.values() for crop in image_crops]
+    embeddings = model.embeddings(images=crops) if crops else []
+
+    computed = {}
+    offset = 0
+    for digest, (detections, _) in detected.items():
+        computed[digest] = [
+            {**det, "embedding": emb}
+            for det, emb in zip(detections, embeddings[offset:offset + len(detections)])
+        ]
+        offset += len(detections)
+    return computed
+
+
+def _lookup_detections(digest):
+    """Busca as detecções no LRU em processo e, na falta, no cache do Redis."""
+    with _detections_lock:
+        detections = _DETECTIONS_CACHE.get(digest)
+        if detections is not None:
+            _DETECTIONS_CACHE.move_to_end(digest)
+            return detections
+
+    detections = get_cached_detections(digest)
+    if detections is not None:
+        _remember_detections(digest, detections)
+    return detections
+
+
+def _remember_detections(digest, detections):
+    with _detections_lock:
+        _DETECTIONS_CACHE[digest] = detections
+        if len(_DETECTIONS_CACHE) > DETECTIONS_CACHE_MAX:
+            _DETECTIONS_CACHE.popitem(last=False)
+
+
+def _draw_boxes(image, boxes, highlight=None, scale=1):
+    """
+    Desenha as caixas (x, y, w, h) do detector sobre a imagem.
 
-        image = Image.open(image_file).convert("RGB")
-        image_np = np.array(image).astype(np.uint8)
+    As caixas são convertidas de uma vez para int32 (divididas por `scale`
+    quando a imagem foi decodificada reduzida); com `highlight`, só essa
+    caixa sai em vermelho e as demais em azul.
+    """
+    rects = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+    if scale != 1:
+        rects = rects // scale
+    rects = rects.tolist()
+    for i, rect in enumerate(rects):
+        color = (255, 0, 0) if highlight is None or i == highlight else (0, 0, 255)
+        cv2.rectangle(image, rect, color, 3)
 
-        detections = model.extract(image_np, threshold=0.95)
-        if not detections:
-            return {"error": "Nenhum rosto detectado na imagem."}, 400
 
-        image_copy = image_np.copy()
-        all_boxes = []
+def _encode_and_save(image_np, save_path):
+    """Codifica e grava a imagem (JPEG com qualidade fixa; PNG para depuração)."""
+    if os.path.splitext(save_path)[1].lower() in (".jpg", ".jpeg"):
+        Image.fromarray(image_np).save(save_path, format="JPEG", quality=JPEG_QUALITY, optimize=False)
+    else:
+        Image.fromarray(image_np).save(save_path)
 
-        for det in detections:
-            box = det["box"]
-            all_boxes.append(box)
 
-            try:
-                cv2.rectangle(image_copy, box, (255, 0, 0), 3)
-            except Exception:
-                x1, y1, x2, y2 = map(int, box)
-                cv2.rectangle(image_copy, (x1, y1), (x2, y2), (255, 0, 0), 3)
+def encode_processed_image(image_np):
+    """
+    Codifica a imagem processada em JPEG direto na memória.
 
-        embedding = detections[0]["embedding"]
+    Para quem só envia a imagem adiante (ex.: upload ao S3): sem escrita e
+    releitura em `processed_faces/`.
+
+    Returns:
+        bytes: Conteúdo JPEG.
+    """
+    with io.BytesIO() as buf:
+        Image.fromarray(image_np).save(buf, format="JPEG", quality=JPEG_QUALITY)
+        return buf.getvalue()
+
+
+def _forget_save(save_path, future):
+    # Gravações com falha ficam registradas para `wait_processed_image` as ver
+    if future.exception() is not None:
+        print(f"[Embeddings] ⚠️ Falha ao gravar {save_path}: {future.exception()}")
+        return
+    with _saves_lock:
+        if _PENDING_SAVES.get(save_path) is future:
+            del _PENDING_SAVES[save_path]
+
+
+def _save_processed_image(image_np, boxes, image_file, suffix, default_name, highlight=None, scale=1):
+    """
+    Desenha as caixas sobre a imagem decodificada e agenda a gravação em
+    `processed_faces/`.
+
+    A imagem é desenhada no lugar (cada chamada decodifica a sua própria). O
+    encode e a escrita rodam no `_IO_POOL`: o caminho é retornado antes de o
+    arquivo existir; antes de entregá-lo ao cliente (ou lê-lo), chame
+    `wait_processed_image`.
+
+    Returns:
+        str: Caminho do arquivo (gravação possivelmente em andamento).
+    """
+    _draw_boxes(image_np, boxes, highlight=highlight, scale=scale)
+
+    save_dir = "processed_faces"
+    os.makedirs(save_dir, exist_ok=True)
+
+    name = getattr(image_file, "filename", None) or default_name
+    base, ext = os.path.splitext(name)
+    save_path = os.path.join(save_dir, f"{base}{suffix}{ext}")
+
+    future = _IO_POOL.submit(_encode_and_save, image_np, save_path)
+    with _saves_lock:
+        _PENDING_SAVES[save_path] = future
+    future.add_done_callback(lambda f: _forget_save(save_path, f))
+    return save_path
+
+
+def wait_processed_image(save_path, timeout=PROCESSED_IMAGE_WAIT):
+    """
+    Aguarda a gravação de uma imagem agendada por `_save_processed_image`.
+
+    Args:
+        save_path (str | None): Caminho retornado pelo serviço.
+        timeout (float, optional): Espera máxima, em segundos.
 
-        # salvar imagem
-        save_dir = "processed_faces"
-        os.makedirs(save_dir, exist_ok=True)
+    Returns:
+        str | None: O caminho, já gravado; None se não houver imagem ou se a
+        gravação falhou (ou não terminou dentro de `timeout`).
+    """
+    if save_path is None:
+        return None
+    with _saves_lock:
+        future = _PENDING_SAVES.get(save_path)
+    if future is None:
+        return save_path
+
+    try:
+        future.result(timeout=timeout)
+        return save_path
+    except Exception as e:
+        print(f"[Embeddings] ⚠️ Imagem processada indisponível ({save_path}): {e}")
+        return None
+    finally:
+        if future.done():
+            with _saves_lock:
+                if _PENDING_SAVES.get(save_path) is future:
+                    del _PENDING_SAVES[save_path]
+
+
+def generate_embeddings(image_file, save_image=True):
+    try:
+        image_np, detections, scale = extract_faces(image_file)
+        if not detections:
+            return {"error": "Nenhum rosto detectado na imagem."}, 400
 
-        name = getattr(image_file, "filename", None) or "image.jpg"
-        base, ext = os.path.splitext(name)
-        out_name = f"{base}_processed{ext}"
+        all_boxes = [det["box"] for det in detections]
+        embedding = detections[0]["embedding"]
 
-        save_path = os.path.join(save_dir, out_name)
-        Image.fromarray(image_copy).save(save_path)
+        # salvar imagem (só quando o chamador usa o arquivo processado)
+        save_path = None
+        if save_image:
+            save_path = _save_processed_image(
+                image_np, all_boxes, image_file, "_processed", "image.jpg", scale=scale
+            )
 
         return {
-            "embedding": np.array(embedding).tolist(),
+            # ndarray float32 sem cópia extra; a conversão para lista/base64 fica
+            # na borda (encode_embedding, ORJSONProvider, pymilvus)
+            "embedding": np.asarray(embedding, dtype=np.float32),
             "boxes": all_boxes,
             "processed_image_path": save_path
         }, 200
@@ -82,21 +410,27 @@ def compare_embeddings(image1_file, image2_file, threshold=0.7):
         Exception: Em caso de falha inesperada durante a comparação.
     """
     try:
-        emb1, status1 = generate_embeddings(image1_file)
-        emb2, status2 = generate_embeddings(image2_file)
+        #  As duas imagens em um lote: uma única inferência do FaceNet
+        try:
+            (_, dets1, _), (_, dets2, _) = extract_faces_batch([image1_file, image2_file])
+        except Exception:
+            dets1 = dets2 = None
 
-        if status1 != 200 or status2 != 200:
+        if not dets1 or not dets2:
             return {"error": "Não foi possível extrair embeddings de uma das imagens."}, 400
 
-        v1 = np.array(emb1["embedding"])
-        v2 = np.array(emb2["embedding"])
+        v1 = decode_embedding(dets1[0]["embedding"])
+        v2 = decode_embedding(dets2[0]["embedding"])
 
-        # Distância euclidiana
-        distance = norm(v1 - v2)
-        same_person = bool(distance < threshold)
+        # Distância euclidiana: produto escalar float32 (sdot do BLAS); a
+        # decisão usa a distância ao quadrado contra threshold²
+        diff = v1 - v2
+        sq_distance = float(diff @ diff)
+        distance = math.sqrt(sq_distance)
+        same_person = sq_distance < threshold * threshold
         
         return {
-            "distance": float(distance),
+            "distance": distance,
             "same_person": same_person
         }, 200
 
@@ -104,72 +438,50 @@ def compare_embeddings(image1_file, image2_file, threshold=0.7):
     except Exception as e:
         return {"error": str(e)}, 500
 
-def detect_and_search_faces(image_file, top_k=3):
+def detect_and_search_faces(image_file, top_k=3, save_image=True, encode_image=False):
     try:
-        import os
-        import cv2
-        from PIL import Image
-        import numpy as np
-        from app.services.milvus_service import search_similar_faces
-
-        model = get_facenet_model()
-
-        image = Image.open(image_file).convert("RGB")
-        image_np = np.array(image).astype(np.uint8)
-
-        detections = model.extract(image_np, threshold=0.95)
+        image_np, detections, scale = extract_faces(image_file)
         if not detections:
             return {"error": "Nenhum rosto detectado na imagem."}, 400
 
-        boxes = []
-        matches = []
-        distances = []
-        image_copy = image_np.copy()
-
-        for det in detections:
-            box = det["box"]
-            embedding = det["embedding"]
-
-            boxes.append(box)
+        boxes = [det["box"] for det in detections]
+        matches = [None] * len(detections)
+        distances = np.full(len(detections), np.inf, dtype=np.float32)
 
-            best = search_similar_faces(embedding, top_k=top_k)
+        #  Uma única busca no Milvus para todos os rostos detectados
+        batch = search_similar_faces_batch([det["embedding"] for det in detections], top_k=top_k)
+        for i, best in enumerate(batch):
             if best:
-                distances.append(best[0]["distance"])
-                matches.append(best[0])
-            else:
-                distances.append(float("inf"))
-                matches.append(None)
+                distances[i] = best[0]["distance"]
+                matches[i] = best[0]
 
         winner_index = int(np.argmin(distances))
         winner_box = boxes[winner_index]
         winner_match = matches[winner_index]
 
-        # desenhar
-        for i, box in enumerate(boxes):
-            color = (255, 0, 0) if i == winner_index else (0, 0, 255)
-            try:
-                cv2.rectangle(image_copy, box, color, 3)
-            except:
-                x1, y1, x2, y2 = map(int, box)
-                cv2.rectangle(image_copy, (x1, y1), (x2, y2), color, 3)
-
-        save_dir = "processed_faces"
-        os.makedirs(save_dir, exist_ok=True)
-
-        name = getattr(image_file, "filename", None) or "search.jpg"
-        base, ext = os.path.splitext(name)
-        out_name = f"{base}_search_processed{ext}"
-
-        save_path = os.path.join(save_dir, out_name)
-        Image.fromarray(image_copy).save(save_path)
-
-        return {
+        # desenhar e salvar (só quando o chamador usa o arquivo processado);
+        # com `encode_image` a imagem vai em bytes JPEG, sem passar pelo disco
+        save_path = None
+        processed_bytes = None
+        if encode_image:
+            _draw_boxes(image_np, boxes, highlight=winner_index, scale=scale)
+            processed_bytes = encode_processed_image(image_np)
+        elif save_image:
+            save_path = _save_processed_image(
+                image_np, boxes, image_file, "_search_processed", "search.jpg",
+                highlight=winner_index, scale=scale
+            )
+
+        result = {
             "processed_image_path": save_path,
             "boxes": boxes,
             "winner_box": winner_box,
             "winner_index": winner_index,
             "winner_match": winner_match
-        }, 200
+        }
+        if encode_image:
+            result["processed_image_bytes"] = processed_bytes
+        return result, 200
 
     except Exception as e:
         return {"error": str(e)}, 500
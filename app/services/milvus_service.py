@@ -3,6 +3,15 @@ from pymilvus import (
     FieldSchema, CollectionSchema, DataType,
     Collection, utility
 )
+from pymilvus.client.types import LoadState
+from pymilvus.exceptions import CollectionNotExistException, ErrorCode, MilvusException
+from app.services.redis_service import rebuild_suspects_index, bump_faces_version, reserve_face_ids
+from concurrent.futures import Future, ThreadPoolExecutor
+import atexit
+import numpy as np
+import orjson
+import queue
+import threading
 import time
 import uuid
 import os
@@ -10,6 +19,49 @@ import os
 # Nome fixo da collection
 COLLECTION_NAME = "faces"
 
+# Índice vetorial do campo `embedding`. IVF_SQ8 aplica quantização escalar
+# (float32 → int8) dentro do índice: ~4x menos memória por vetor no Milvus,
+# com perda de precisão desprezível para embeddings faciais.
+INDEX_PARAMS = {
+    "metric_type": "L2",
+    "index_type": "IVF_SQ8",
+    "params": {"nlist": 128}
+}
+
+# Parâmetros da busca vetorial (mesma métrica do índice), reaproveitados em
+# todas as buscas
+SEARCH_PARAMS = {"metric_type": "L2", "params": {"nprobe": 10}}
+
+# Filtros escalares usados pelas rotas. O Milvus 2.4.4 (docker-compose) ainda
+# não aceita `expr_params`, então os valores são formatados via `build_expr`,
+# que só admite inteiros — nenhum texto do cliente chega à expressão.
+REGISTERED_EXPR = "is_query == false"
+SUSPECT_FACES_EXPR = "is_query == false and suspect_id == {sid}"
+SUSPECTS_FACES_EXPR = "is_query == false and suspect_id in {sids}"
+SUSPECT_EXPR = "suspect_id == {sid}"
+SUSPECTS_EXPR = "suspect_id in {sids}"
+FACE_EXPR = "face_id == {fid}"
+FACES_EXPR = "face_id in {fids}"
+ALL_FACES_EXPR = "face_id >= 0"
+
+# Tamanho máximo recomendado para listas em filtros `in`
+MAX_IN_LIST = 4096
+
+# Handle da collection carregada, compartilhado pelas rotas (criado sob demanda)
+_collection = None
+_collection_lock = threading.Lock()
+# Nomes dos campos do schema, na ordem da collection (preenchido sob demanda)
+_field_names = None
+
+# Intervalo (segundos) da verificação de conexão/carga em segundo plano
+MILVUS_KEEPALIVE_INTERVAL = int(os.getenv("MILVUS_KEEPALIVE_INTERVAL", 60))
+_keepalive_stop = threading.Event()
+_keepalive_thread = None
+
+# Cache (com TTL) do resultado de utility.has_collection, inclusive negativo
+HAS_COLLECTION_TTL = 60
+_HAS_COLL_CACHE = {"exists": None, "expires": 0.0}
+
 # ============================================================
 # Conexão com o servidor Milvus
 # ============================================================
@@ -56,6 +108,8 @@ def create_collection_if_not_exists(dim=512):
         Collection: Instância da collection existente ou recém-criada.
     """
     if utility.has_collection(COLLECTION_NAME):
+        # Pode ter sido criada por outro processo: corrige um cache negativo
+        set_collection_exists(True)
         return Collection(COLLECTION_NAME)
 
     fields = [
@@ -73,19 +127,274 @@ def create_collection_if_not_exists(dim=512):
     print("[Milvus] 🆕 Collection 'faces' criada com sucesso com campo 's3_path'.")
 
     #  Cria índice vetorial
-    index_params = {
-        "metric_type": "L2",
-        "index_type": "IVF_FLAT",
-        "params": {"nlist": 128}
-    }
-    collection.create_index(field_name="embedding", index_params=index_params)
-    print("[Milvus] 🧩 Índice vetorial criado (IVF_FLAT, L2).")
+    collection.create_index(field_name="embedding", index_params=INDEX_PARAMS)
+    print("[Milvus] 🧩 Índice vetorial criado (IVF_SQ8, L2).")
+    set_collection_exists(True)
 
     return collection
 
 
 # ============================================================
-#  Inserção de uma face
+#  Expressões de filtro
+# ============================================================
+def build_expr(template, **params):
+    """
+    Preenche um dos templates de filtro com parâmetros inteiros.
+
+    Args:
+        template (str): Template, ex.: `FACE_EXPR`.
+        **params: Valores do template (convertidos com `int`; listas viram
+            listas de inteiros, para filtros `in`).
+
+    Returns:
+        str: Expressão pronta para `query`/`delete`.
+
+    Raises:
+        ValueError: Se algum parâmetro não for inteiro.
+    """
+    return template.format(**{
+        name: [int(v) for v in value] if isinstance(value, (list, tuple, set)) else int(value)
+        for name, value in params.items()
+    })
+
+
+# ============================================================
+#  Consulta de várias faces por ID
+# ============================================================
+def query_faces_by_ids(collection, ids, output_fields):
+    """
+    Consulta várias faces pelo ID com filtros `face_id in [...]`.
+
+    Uma única RPC por bloco de até `MAX_IN_LIST` IDs, em vez de uma por face.
+
+    Args:
+        collection (Collection): Collection carregada.
+        ids (Iterable[int]): IDs das faces.
+        output_fields (list[str]): Campos retornados.
+
+    Returns:
+        list[dict]: Linhas encontradas (IDs inexistentes são ignorados).
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    rows = []
+    for start in range(0, len(ids), MAX_IN_LIST):
+        rows.extend(collection.query(
+            expr=build_expr(FACES_EXPR, fids=ids[start:start + MAX_IN_LIST]),
+            output_fields=output_fields
+        ))
+    return rows
+
+
+def delete_faces_by_ids(collection, ids):
+    """
+    Remove várias faces pela chave primária com filtros `face_id in [...]`.
+
+    Args:
+        collection (Collection): Collection carregada.
+        ids (Iterable[int]): IDs das faces.
+
+    Returns:
+        int: Quantidade de linhas removidas.
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    deleted = 0
+    for start in range(0, len(ids), MAX_IN_LIST):
+        result = collection.delete(expr=build_expr(FACES_EXPR, fids=ids[start:start + MAX_IN_LIST]))
+        deleted += result.delete_count
+    return deleted
+
+
+def delete_faces_by_suspects(collection, suspect_ids):
+    """
+    Remove as faces de vários suspeitos com filtros `suspect_id in [...]`.
+
+    Args:
+        collection (Collection): Collection carregada.
+        suspect_ids (Iterable[int]): IDs dos suspeitos.
+
+    Returns:
+        int: Quantidade de linhas removidas.
+    """
+    suspect_ids = list(dict.fromkeys(int(i) for i in suspect_ids))
+    deleted = 0
+    for start in range(0, len(suspect_ids), MAX_IN_LIST):
+        result = collection.delete(expr=build_expr(SUSPECTS_EXPR, sids=suspect_ids[start:start + MAX_IN_LIST]))
+        deleted += result.delete_count
+    return deleted
+
+
+# ============================================================
+#  Existência da collection (cache com TTL)
+# ============================================================
+def has_collection_cached():
+    """
+    Versão com cache de `utility.has_collection(COLLECTION_NAME)`.
+
+    O resultado (positivo ou negativo) é reaproveitado por `HAS_COLLECTION_TTL`
+    segundos, evitando uma RPC ao Milvus a cada requisição.
+
+    Returns:
+        bool: True se a collection existe.
+    """
+    now = time.time()
+    cache = _HAS_COLL_CACHE
+    if cache["expires"] < now:
+        cache["exists"] = utility.has_collection(COLLECTION_NAME)
+        cache["expires"] = now + HAS_COLLECTION_TTL
+    return cache["exists"]
+
+
+def set_collection_exists(exists):
+    """Atualiza o cache de existência após criar ou remover a collection."""
+    _HAS_COLL_CACHE["exists"] = exists
+    _HAS_COLL_CACHE["expires"] = time.time() + HAS_COLLECTION_TTL
+
+
+# ============================================================
+#  Handle compartilhado da collection
+# ============================================================
+def get_collection():
+    """
+    Retorna o handle da collection 'faces' já carregada em memória.
+
+    Na primeira chamada conecta ao Milvus, instancia a `Collection` e executa
+    `load()` uma única vez; as chamadas seguintes reutilizam o mesmo handle,
+    evitando os round-trips de conexão e carga a cada requisição. Se a conexão
+    "default" tiver sido encerrada, ela é restabelecida antes do retorno.
+
+    Returns:
+        Collection | None: Collection carregada, ou None se ela não existir.
+    """
+    global _collection
+    if _collection is not None and not connections.has_connection("default"):
+        with _collection_lock:
+            connect_milvus()
+    if _collection is None:
+        with _collection_lock:
+            if _collection is None:
+                connect_milvus()
+                if not has_collection_cached():
+                    return None
+                collection = Collection(COLLECTION_NAME)
+                collection.load()
+                _collection = collection
+    return _collection
+
+
+def get_field_names(collection):
+    """
+    Retorna os nomes dos campos gravados pelo cliente, na ordem do schema.
+
+    Campos com `auto_id` são omitidos. O resultado é calculado uma vez por
+    handle e reaproveitado (ex.: para montar linhas de `upsert`).
+
+    Args:
+        collection (Collection): Collection carregada.
+
+    Returns:
+        tuple[str]: Nomes dos campos.
+    """
+    global _field_names
+    if _field_names is None:
+        _field_names = tuple(
+            f.name for f in collection.schema.fields
+            if not (f.is_primary and f.auto_id)
+        )
+    return _field_names
+
+
+def init_milvus():
+    """
+    Conecta ao Milvus e carrega a collection na subida da aplicação.
+
+    Falhas são apenas logadas: se o Milvus ainda não estiver disponível,
+    a primeira requisição faz a conexão via `get_collection`.
+    """
+    try:
+        collection = get_collection()
+        if collection is None:
+            print(f"[Milvus] ⚠️ Collection '{COLLECTION_NAME}' ainda não existe.")
+            return
+    except Exception as e:
+        print(f"[Milvus] ⚠️ Não foi possível conectar na inicialização: {e}")
+        return
+
+    warmup_search(collection)
+    start_keepalive()
+
+
+def start_keepalive():
+    """Inicia (uma vez por processo) a thread que mantém a collection carregada."""
+    global _keepalive_thread
+    with _collection_lock:
+        if _keepalive_thread is not None:
+            return
+        _keepalive_thread = threading.Thread(target=_keepalive_loop, name="milvus-keepalive", daemon=True)
+        _keepalive_thread.start()
+
+
+def _keepalive_loop():
+    """
+    A cada `MILVUS_KEEPALIVE_INTERVAL` segundos reconecta se a conexão caiu e
+    refaz o `load()` apenas se a collection não estiver mais carregada (ex.:
+    restart do Milvus). As rotas nunca chamam `load()`.
+    """
+    while not _keepalive_stop.wait(MILVUS_KEEPALIVE_INTERVAL):
+        try:
+            collection = get_collection()
+            if collection is not None and utility.load_state(COLLECTION_NAME) == LoadState.NotLoad:
+                print(f"[Milvus] ⚠️ Collection '{COLLECTION_NAME}' descarregada; recarregando ...")
+                collection.load()
+        except Exception as e:
+            print(f"[Milvus] ⚠️ Falha na verificação da collection: {e}")
+
+
+def warmup_search(collection):
+    """
+    Executa uma busca descartável para aquecer o índice vetorial.
+
+    A primeira busca após o `load()` paga o custo de preparar os segmentos no
+    query node; fazê-la na subida tira esse pico da primeira requisição real.
+    """
+    try:
+        dim = next(f.params["dim"] for f in collection.schema.fields if f.name == "embedding")
+        collection.search(
+            data=[[0.0] * dim],
+            anns_field="embedding",
+            param=SEARCH_PARAMS,
+            limit=1,
+            expr=REGISTERED_EXPR
+        )
+        print("[Milvus] Índice vetorial aquecido.")
+    except Exception as e:
+        print(f"[Milvus] ⚠️ Falha no aquecimento do índice: {e}")
+
+
+@atexit.register
+def _disconnect_milvus():
+    _keepalive_stop.set()
+    if connections.has_connection("default"):
+        connections.disconnect("default")
+
+
+def _is_collection_missing(exc):
+    """Indica se o erro do Milvus é de collection inexistente (ex.: removida por outro processo)."""
+    if isinstance(exc, CollectionNotExistException):
+        return True
+    return exc.code == ErrorCode.COLLECTION_NOT_FOUND or "collection not found" in str(exc.message).lower()
+
+
+def reset_collection_cache():
+    """Descarta o handle e o cache de existência (ex.: após a collection ser removida)."""
+    global _collection, _field_names
+    with _collection_lock:
+        _collection = None
+        _field_names = None
+    _HAS_COLL_CACHE["expires"] = 0.0
+
+
+# ============================================================
+#  Inserção de faces
 # ============================================================
 def insert_face(suspect_id, embedding, is_query=False, metadata=None, s3_path=None):
     """
@@ -102,37 +411,118 @@ def insert_face(suspect_id, embedding, is_query=False, metadata=None, s3_path=No
     Returns:
         int: O ID incremental da face inserida.
     """ 
-    connect_milvus()
-    collection = create_collection_if_not_exists(dim=len(embedding))
-
-    if not collection.indexes:
-        index_params = {
-            "metric_type": "L2",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128}
-        }
-        collection.create_index(field_name="embedding", index_params=index_params)
-
-    total_count = collection.num_entities
-    face_id = int(total_count) + 1
+    return insert_faces([{
+        "suspect_id": suspect_id,
+        "embedding": embedding,
+        "is_query": is_query,
+        "metadata": metadata,
+        "s3_path": s3_path
+    }])[0]
+
+
+def insert_faces(faces):
+    """
+    Insere várias faces com um único `insert` no Milvus.
+
+    O handle compartilhado já está carregado: as linhas novas ficam visíveis
+    para buscas e consultas sem `load()`. O selo dos segmentos fica com o
+    Milvus (ou com `flush_inserts`, quando o chamador precisar).
+
+    Args:
+        faces (list[dict]): Faces com as chaves de `insert_face` (suspect_id,
+            embedding e, opcionais, is_query, metadata, s3_path).
+
+    Returns:
+        list[int]: IDs das faces inseridas, na ordem recebida.
+    """
+    if not faces:
+        return []
+
+    try:
+        return _insert_faces(faces)
+    except MilvusException as e:
+        if not _is_collection_missing(e):
+            raise
+        #  O handle em cache aponta para uma collection removida em outro
+        #  processo (/faces/clear): descarta, recria e tenta uma vez mais
+        print("[Milvus] ⚠️ Collection removida por outro processo; recriando o handle.")
+        reset_collection_cache()
+        set_collection_exists(False)
+        return _insert_faces(faces)
+
+
+def _insert_faces(faces):
+    collection = get_collection()
+    if collection is None:
+        #  Primeiro registro: cria a collection (já com o índice) e carrega o handle
+        create_collection_if_not_exists(dim=len(faces[0]["embedding"]))
+        collection = get_collection()
+        if collection is None:
+            raise Exception(f"Collection '{COLLECTION_NAME}' indisponível após a criação.")
+
+    #  IDs do contador atômico no Redis: sem RPC de estatísticas ao Milvus e
+    #  sem colisão entre inserções concorrentes
+    first_id = reserve_face_ids(len(faces), lambda: max_face_id(collection))
     timestamp = int(time.time())
 
-    data = [
-        [face_id],
-        [int(suspect_id) if suspect_id else 0],
-        [embedding],
-        [timestamp],
-        [is_query],
-        [str(metadata or {})],
-        [s3_path or ""]  # 🆕 salva o path do S3
+    #  Linhas já com os tipos do schema: o pymilvus empacota linhas pelo schema
+    #  da collection, e o embedding como lista de floats evita a conversão
+    #  elemento a elemento de um ndarray
+    rows = []
+    for offset, face in enumerate(faces):
+        metadata = face.get("metadata")
+        rows.append({
+            "face_id": first_id + offset,
+            "suspect_id": int(face["suspect_id"]) if face.get("suspect_id") else 0,
+            "embedding": np.asarray(face["embedding"], dtype=np.float32).tolist(),
+            "timestamp": timestamp,
+            "is_query": bool(face.get("is_query", False)),
+            "metadata": metadata if isinstance(metadata, str) else orjson.dumps(metadata or {}).decode(),
+            "s3_path": face.get("s3_path") or ""  # 🆕 salva o path do S3
+        })
+
+    collection.insert(rows)
+
+    bump_faces_version()
+
+    #  Espelha as faces cadastradas no índice de suspeitos do Redis (um pipeline)
+    registered = [
+        {name: row[name] for name in ("face_id", "suspect_id", "timestamp", "metadata", "s3_path")}
+        for row in rows if not row["is_query"]
     ]
+    if registered:
+        rebuild_suspects_index(registered, complete=False)
+
+    for row in rows:
+        print(f"[Milvus] ✅ Face inserida (face_id={row['face_id']}, s3_path={row['s3_path'] or None})")
+    return [row["face_id"] for row in rows]
+
+
+def max_face_id(collection):
+    """
+    Maior face_id gravado (0 se a collection estiver vazia).
+
+    Varre apenas a chave primária em lotes; usado só para semear o contador
+    de IDs no Redis.
+    """
+    iterator = collection.query_iterator(batch_size=16384, expr=ALL_FACES_EXPR, output_fields=["face_id"])
+    largest = 0
+    try:
+        while True:
+            batch = iterator.next()
+            if not batch:
+                break
+            largest = max(largest, max(int(row["face_id"]) for row in batch))
+    finally:
+        iterator.close()
+    return largest
 
-    collection.insert(data)
-    collection.flush()
-    collection.load()
 
-    print(f"[Milvus] ✅ Face inserida (face_id={face_id}, s3_path={s3_path})")
-    return face_id
+def flush_inserts():
+    """Sela os segmentos com as inserções pendentes (ex.: ao fim de uma carga em lote)."""
+    collection = get_collection()
+    if collection is not None:
+        collection.flush()
 
 
 
@@ -160,40 +550,57 @@ def search_similar_faces(embedding, top_k=3):
     Raises:
         Exception: Caso a collection 'faces' não exista.
     """
-    connect_milvus()
+    return search_similar_faces_batch([embedding], top_k=top_k)[0]
 
-    if not utility.has_collection(COLLECTION_NAME):
-        raise Exception(f"Collection '{COLLECTION_NAME}' não existe.")
 
-    collection = Collection(COLLECTION_NAME)
-    collection.load()
+def search_similar_faces_batch(embeddings, top_k=3):
+    """
+    Busca as faces cadastradas mais semelhantes a vários embeddings em uma
+    única RPC de busca (ex.: todos os rostos detectados em uma imagem).
 
-    #  Filtra apenas embeddings de suspeitos cadastrados
-    # Retorna face_ids válidos para busca
-    registered_faces = collection.query(
-        expr="is_query == false",
-        output_fields=["face_id"]
-    )
+    Args:
+        embeddings (list[list[float]]): Vetores usados como consulta.
+        top_k (int, optional): Número máximo de resultados por vetor. Default é 3.
 
-    if not registered_faces:
-        print("[Milvus] ⚠️ Nenhuma face registrada encontrada.")
-        return []
+    Returns:
+        list[list[dict]]: Para cada embedding, na mesma ordem, a lista de
+        correspondências no formato de `search_similar_faces`.
 
-    valid_face_ids = [int(f["face_id"]) for f in registered_faces]
+    Raises:
+        Exception: Caso a collection 'faces' não exista.
+    """
+    try:
+        return _search_batch(embeddings, top_k)
+    except MilvusException as e:
+        if not _is_collection_missing(e):
+            raise
+        #  Handle obsoleto (collection removida/recriada em outro processo):
+        #  descarta e busca de novo com um handle novo
+        print("[Milvus] ⚠️ Collection removida por outro processo; renovando o handle.")
+        reset_collection_cache()
+        return _search_batch(embeddings, top_k)
+
+
+def _search_batch(embeddings, top_k):
+    collection = get_collection()
+    if collection is None:
+        raise Exception(f"Collection '{COLLECTION_NAME}' não existe.")
 
-    #  Busca vetorial apenas entre os registros válidos
-    search_params = {"metric_type": "L2", "params": {"nprobe": 10}}
+    #  Busca vetorial apenas entre os registros válidos, todos os vetores de uma vez.
+    #  O filtro `is_query == false` é aplicado pelo Milvus dentro da varredura
+    #  dos segmentos, sem trazer a lista de face_ids cadastrados para o cliente.
     results = collection.search(
-        data=[embedding],
+        data=list(embeddings),
         anns_field="embedding",
-        param=search_params,
+        param=SEARCH_PARAMS,
         limit=top_k,
         output_fields=["suspect_id", "is_query"],
-        expr=f"face_id in {valid_face_ids}"
+        expr=REGISTERED_EXPR
     )
 
-    matches = []
+    batch = []
     for hits in results:
+        matches = []
         for hit in hits:
             if not hit.entity.get("is_query"):  # reforço extra
                 matches.append({
@@ -201,8 +608,194 @@ def search_similar_faces(embedding, top_k=3):
                     "suspect_id": hit.entity.get("suspect_id"),
                     "distance": hit.distance
                 })
+        batch.append(matches)
 
-    print(f"[Milvus] 🔍 {len(matches)} resultados encontrados (somente cadastrados).")
-    return matches
+    print(f"[Milvus] 🔍 {sum(map(len, batch))} resultados encontrados para {len(batch)} vetor(es) (somente cadastrados).")
+    return batch
 
 
+# ============================================================
+#  Agrupamento de consultas concorrentes por suspeito
+# ============================================================
+class FacesBatcher:
+    """
+    Junta consultas concorrentes de faces por suspeito em uma única query.
+
+    Cada chamada de `get` entra em uma fila; uma thread de fundo espera até
+    `window` segundos por outras chamadas (no máximo `max_batch`) e entrega o
+    lote a um pool de `max_inflight` threads, que faz um só `query` com
+    `suspect_id in [...]` (consistência "Eventually", pois só atende leituras)
+    e distribui as linhas para cada chamador. Uma query lenta não segura os
+    lotes seguintes.
+    Sob carga, N requisições simultâneas pagam ~1 round-trip ao Milvus em vez de N;
+    uma chamada isolada (fila vazia, nada em andamento) não espera a janela.
+    """
+
+    OUTPUT_FIELDS = ["face_id", "suspect_id", "timestamp", "metadata", "s3_path"]
+
+    def __init__(self, max_batch=32, window=0.005, max_inflight=4):
+        self.max_batch = max_batch
+        self.window = window
+        self.max_inflight = max_inflight
+        self._queue = queue.Queue()
+        self._thread = None
+        self._executor = None
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    def get(self, suspect_id, output_fields=None, timeout=30):
+        """
+        Retorna as faces cadastradas de um suspeito.
+
+        Args:
+            suspect_id (int): ID do suspeito.
+            output_fields (list[str], optional): Campos retornados. Default `OUTPUT_FIELDS`.
+            timeout (float, optional): Tempo máximo de espera, em segundos.
+
+        Returns:
+            list[dict] | None: Linhas das faces, ou None se a collection não existir.
+        """
+        self._ensure_started()
+        future = Future()
+        fields = tuple(output_fields or self.OUTPUT_FIELDS)
+        self._queue.put((int(suspect_id), fields, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_inflight, thread_name_prefix="faces-batcher-query"
+                    )
+                    self._thread = threading.Thread(target=self._run, name="faces-batcher", daemon=True)
+                    self._thread.start()
+
+    def _drain(self):
+        batch = [self._queue.get()]
+        with self._lock:
+            idle = self._inflight == 0
+        if idle and self._queue.empty():
+            # Nada para agrupar: não paga a janela
+            return batch
+
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._drain()
+            with self._lock:
+                self._inflight += 1
+            self._executor.submit(self._process, batch).add_done_callback(self._batch_done)
+
+    def _batch_done(self, _):
+        with self._lock:
+            self._inflight -= 1
+
+    def _process(self, batch):
+        # Uma query por conjunto de campos pedido (normalmente só um)
+        by_fields = {}
+        for sid, fields, future in batch:
+            by_fields.setdefault(fields, []).append((sid, future))
+
+        for fields, pending in by_fields.items():
+            try:
+                self._query(fields, pending)
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _query(self, fields, pending):
+        collection = get_collection()
+        if collection is None:
+            for _, future in pending:
+                future.set_result(None)
+            return
+
+        output_fields = list(fields)
+        if "suspect_id" not in output_fields:
+            output_fields.append("suspect_id")
+
+        suspect_ids = sorted({sid for sid, _ in pending})
+        rows = collection.query(
+            expr=build_expr(SUSPECTS_FACES_EXPR, sids=suspect_ids),
+            output_fields=output_fields,
+            consistency_level="Eventually"
+        )
+
+        by_suspect = {}
+        for row in rows:
+            by_suspect.setdefault(row["suspect_id"], []).append(row)
+
+        # Cada chamador recebe cópias próprias (as rotas alteram as linhas)
+        for sid, future in pending:
+            future.set_result([dict(row) for row in by_suspect.get(sid, [])])
+
+
+faces_batcher = FacesBatcher()
+
+
+# ============================================================
+#  Metadados do suspeito (cache com TTL)
+# ============================================================
+SUSPECT_METADATA_TTL = 60
+SUSPECT_METADATA_MAX = 4096
+_SUSPECT_METADATA_CACHE = {}
+_SUSPECT_METADATA_LOCK = threading.Lock()
+
+
+def get_suspect_metadata(suspect_id):
+    """
+    Retorna os metadados da face cadastrada mais recente de um suspeito.
+
+    O resultado fica em cache por `SUSPECT_METADATA_TTL` segundos, evitando uma
+    consulta ao Milvus a cada busca em que o mesmo suspeito vence. As rotas que
+    alteram faces chamam `invalidate_suspect_metadata`.
+
+    Args:
+        suspect_id (int): ID do suspeito.
+
+    Returns:
+        dict | str | None: Metadados decodificados (string se não forem JSON),
+        ou None se o suspeito não tiver faces cadastradas.
+    """
+    suspect_id = int(suspect_id)
+    now = time.time()
+
+    cached = _SUSPECT_METADATA_CACHE.get(suspect_id)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    faces = faces_batcher.get(suspect_id, ["face_id", "timestamp", "metadata"])
+    metadata = None
+    if faces:
+        raw = max(faces, key=lambda f: f["timestamp"])["metadata"]
+        try:
+            metadata = orjson.loads(raw) if raw else {}
+        except orjson.JSONDecodeError:
+            metadata = raw
+
+    with _SUSPECT_METADATA_LOCK:
+        if len(_SUSPECT_METADATA_CACHE) >= SUSPECT_METADATA_MAX:
+            _SUSPECT_METADATA_CACHE.clear()
+        _SUSPECT_METADATA_CACHE[suspect_id] = (metadata, now + SUSPECT_METADATA_TTL)
+    return metadata
+
+
+def invalidate_suspect_metadata(*suspect_ids):
+    """Remove suspeitos do cache de metadados; sem argumentos, limpa o cache inteiro."""
+    with _SUSPECT_METADATA_LOCK:
+        if not suspect_ids:
+            _SUSPECT_METADATA_CACHE.clear()
+        for sid in suspect_ids:
+            _SUSPECT_METADATA_CACHE.pop(int(sid), None)
@@ -0,0 +1,458 @@
+import os
+import uuid
+
+import msgspec
+import numpy as np
+import orjson
+from redis import BlockingConnectionPool, Redis
+from redis.exceptions import RedisError
+
+# Conexão Redis compartilhada (filas RQ e índices auxiliares)
+redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+# Pool limitado: sob rajadas as threads esperam por uma conexão livre em vez
+# de abrir conexões novas sem limite. Keepalive TCP mantém as conexões ociosas
+# do pool vivas atrás de NAT/load balancer, evitando reconexões (e handshakes TLS)
+redis_pool = BlockingConnectionPool.from_url(
+    redis_url, max_connections=REDIS_MAX_CONNECTIONS, timeout=5, socket_keepalive=True
+)
+redis_conn = Redis(connection_pool=redis_pool)
+# Conexões separadas para leituras bloqueantes (long-polling de jobs): uma
+# espera longa não pode ocupar o pool usado pelas filas e índices
+redis_wait_conn = Redis.from_url(redis_url, socket_keepalive=True)
+
+# Índice de faces por suspeito: um hash por suspeito (face_id -> linha JSON)
+SUSPECT_FACES_KEY = "suspect:{}:faces"
+SUSPECT_FACES_PATTERN = "suspect:*:faces"
+# Marca que o índice foi reconstruído a partir do Milvus e está completo
+SUSPECTS_INDEX_READY_KEY = "suspects:index:ready"
+# Contador incrementado a cada escrita na collection (base do ETag das listagens)
+FACES_VERSION_KEY = "faces:version"
+# Presente por `FACES_STALENESS_WINDOW` segundos após cada escrita: enquanto
+# existir, leituras "Eventually" do Milvus podem não refletir a última versão
+FACES_RECENT_WRITE_KEY = "faces:version:recent"
+FACES_STALENESS_WINDOW = float(os.getenv("FACES_STALENESS_WINDOW", 5))
+# Último face_id reservado (gerador atômico de IDs das faces)
+FACE_ID_KEY = "faces:next_id"
+# Embeddings já calculados, indexados pelo ETag do objeto no S3 (hash do conteúdo)
+EMBEDDING_CACHE_KEY = "emb:etag:{}"
+EMBEDDING_CACHE_TTL = 86400
+# Detecções (caixas em coordenadas da imagem original + embeddings) indexadas
+# pelo blake2b dos bytes da imagem; "v2": entradas antigas tinham as caixas na
+# escala da imagem reduzida e são ignoradas
+DETECTIONS_CACHE_KEY = "emb:blake2b:v2:{}"
+
+
+# ============================================================
+#  Serializer dos jobs (RQ)
+# ============================================================
+class MsgpackSerializer:
+    """
+    Serializer do RQ em msgpack (msgspec) no lugar do pickle padrão.
+
+    Argumentos e resultados dos jobs (dicts, listas, bytes) vão ao Redis mais
+    compactos e são codificados/decodificados sem o custo do pickle. Tipos numpy
+    são convertidos para tipos nativos.
+
+    API, workers e `Job.fetch` precisam usar o mesmo serializer.
+    """
+
+    def __init__(self):
+        self._encoder = msgspec.msgpack.Encoder(enc_hook=self._enc_hook)
+        self._decoder = msgspec.msgpack.Decoder()
+
+    @staticmethod
+    def _enc_hook(obj):
+        if isinstance(obj, (np.ndarray, np.generic)):
+            return obj.tolist()
+        raise NotImplementedError(f"Tipo não serializável no job: {type(obj).__name__}")
+
+    def dumps(self, obj):
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+
+job_serializer = MsgpackSerializer()
+
+
+# ============================================================
+#  Índice de suspeitos (espelho leve da collection no Redis)
+# ============================================================
+def index_suspect_face(suspect_id, face):
+    """
+    Registra uma face cadastrada no índice de suspeitos do Redis.
+
+    Falhas no Redis são apenas logadas: o índice é um cache e o Milvus
+    continua sendo a fonte da verdade.
+
+    Args:
+        suspect_id (int): ID do suspeito.
+        face (dict): Linha da face (face_id, suspect_id, timestamp, metadata, s3_path).
+    """
+    try:
+        redis_conn.hset(SUSPECT_FACES_KEY.format(suspect_id), face["face_id"], orjson.dumps(face))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao indexar face {face.get('face_id')}: {e}")
+
+
+def rebuild_suspects_index(faces, complete=True):
+    """
+    Popula o índice de suspeitos com as faces lidas do Milvus.
+
+    Args:
+        faces (list[dict]): Linhas das faces cadastradas (is_query == false).
+        complete (bool, optional): Marca o índice como completo ao final. Use
+            False ao alimentar o índice lote a lote durante uma varredura.
+    """
+    try:
+        pipe = redis_conn.pipeline(transaction=False)
+        for face in faces:
+            pipe.hset(SUSPECT_FACES_KEY.format(face["suspect_id"]), face["face_id"], orjson.dumps(face))
+        if complete:
+            pipe.set(SUSPECTS_INDEX_READY_KEY, 1)
+        pipe.execute()
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao reconstruir índice de suspeitos: {e}")
+
+
+# Reconstrução em andamento: token do processo que detém o direito de
+# limpar e marcar o índice (expira se esse processo morrer no meio da varredura)
+SUSPECTS_REBUILD_KEY = "suspects:rebuild"
+SUSPECTS_REBUILD_TTL = 60
+
+# Libera o token da reconstrução e, se pedido, marca o índice como completo,
+# desde que o token ainda seja o desta reconstrução e nenhuma escrita tenha
+# acontecido durante a varredura (versão das faces igual à lida antes dela)
+_FINISH_INDEX_REBUILD = redis_conn.register_script("""
+if redis.call('GET', KEYS[3]) ~= ARGV[2] then
+    return 0
+end
+redis.call('DEL', KEYS[3])
+if ARGV[3] == '1' and (redis.call('GET', KEYS[1]) or '0') == ARGV[1] then
+    redis.call('SET', KEYS[2], 1)
+    return 1
+end
+return 0
+""")
+
+
+def begin_suspects_index_rebuild():
+    """
+    Tenta assumir a reconstrução do índice a partir do Milvus.
+
+    Só um processo por vez reconstrói (`SET NX` com um token próprio): o
+    vencedor lê a versão das faces antes da varredura e descarta os hashes
+    atuais (linhas que sobraram de reconstruções interrompidas). Quem perde
+    a disputa serve a própria varredura sem tocar no índice.
+
+    Returns:
+        tuple[str, str] | None: (versão, token) a informar em
+        `finish_suspects_index_rebuild`, ou None se outra reconstrução estiver
+        em andamento ou o Redis estiver indisponível.
+    """
+    version = get_faces_version()
+    if version is None:
+        return None
+
+    token = uuid.uuid4().hex
+    try:
+        if not redis_conn.set(SUSPECTS_REBUILD_KEY, token, nx=True, ex=SUSPECTS_REBUILD_TTL):
+            return None
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao iniciar reconstrução do índice de suspeitos: {e}")
+        return None
+
+    invalidate_suspects_index()
+    return version, token
+
+
+def finish_suspects_index_rebuild(rebuild, complete=True):
+    """
+    Encerra uma reconstrução iniciada por `begin_suspects_index_rebuild`.
+
+    O índice só é marcado como completo se `complete` (a varredura terminou),
+    se o token ainda for o desta reconstrução e se a versão das faces não
+    mudou: uma escrita durante a varredura (que o scan pode não ter visto)
+    deixa o índice incompleto para a próxima listagem reconstruí-lo.
+
+    Args:
+        rebuild (tuple[str, str] | None): Retorno de `begin_suspects_index_rebuild`.
+        complete (bool, optional): False se a varredura falhou (só libera o token).
+
+    Returns:
+        bool: True se o índice foi marcado como completo.
+    """
+    if rebuild is None:
+        return False
+    version, token = rebuild
+    try:
+        return bool(_FINISH_INDEX_REBUILD(
+            keys=[FACES_VERSION_KEY, SUSPECTS_INDEX_READY_KEY, SUSPECTS_REBUILD_KEY],
+            args=[version, token, "1" if complete else "0"],
+            client=redis_conn
+        ))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao concluir índice de suspeitos: {e}")
+        return False
+
+
+def get_indexed_suspects():
+    """
+    Lê o índice de suspeitos do Redis.
+
+    Returns:
+        dict | None: {suspect_id: [faces]} ou None se o índice ainda não foi
+        construído (Redis "frio") ou estiver indisponível.
+    """
+    try:
+        if not redis_conn.exists(SUSPECTS_INDEX_READY_KEY):
+            return None
+        return dict(iter_indexed_suspects())
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao ler índice de suspeitos: {e}")
+        return None
+
+
+def suspects_index_ready():
+    """Indica se o índice de suspeitos está completo (False se o Redis falhar)."""
+    try:
+        return bool(redis_conn.exists(SUSPECTS_INDEX_READY_KEY))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao consultar índice de suspeitos: {e}")
+        return False
+
+
+def iter_indexed_suspects(chunk=100):
+    """
+    Percorre o índice de suspeitos sem carregá-lo inteiro em memória.
+
+    Os hashes são lidos em pipelines de `chunk` suspeitos; erros do Redis
+    são propagados ao chamador.
+
+    Yields:
+        tuple[int, list[dict]]: (suspect_id, faces) de cada suspeito.
+    """
+    keys = []
+    for key in redis_conn.scan_iter(match=SUSPECT_FACES_PATTERN, count=1000):
+        keys.append(key)
+        if len(keys) >= chunk:
+            yield from _read_suspect_hashes(keys)
+            keys = []
+    if keys:
+        yield from _read_suspect_hashes(keys)
+
+
+def _read_suspect_hashes(keys):
+    pipe = redis_conn.pipeline(transaction=False)
+    for key in keys:
+        pipe.hgetall(key)
+
+    for hashed in pipe.execute():
+        faces = [orjson.loads(row) for row in hashed.values()]
+        if faces:
+            yield faces[0]["suspect_id"], faces
+
+
+def remove_suspect_faces(*suspect_ids):
+    """Remove do índice todas as faces dos suspeitos (um único DEL)."""
+    if not suspect_ids:
+        return
+    try:
+        redis_conn.delete(*(SUSPECT_FACES_KEY.format(sid) for sid in suspect_ids))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao remover suspeito(s) {list(suspect_ids)} do índice: {e}")
+
+
+def reindex_suspect_faces(removed=(), added=()):
+    """
+    Espelha no índice de suspeitos faces alteradas ou removidas (um pipeline).
+
+    As linhas antigas saem com HDEL e as novas entram com HSET na mesma
+    transação, sem descartar o resto do índice. Se o Redis falhar, o índice é
+    marcado como incompleto: a próxima listagem o reconstrói a partir do
+    Milvus em vez de servir linhas antigas.
+
+    Args:
+        removed (Iterable[tuple[int, int]]): Pares (suspect_id, face_id) a retirar.
+        added (Iterable[dict]): Linhas das faces cadastradas a (re)gravar.
+    """
+    try:
+        pipe = redis_conn.pipeline()
+        for suspect_id, face_id in removed:
+            pipe.hdel(SUSPECT_FACES_KEY.format(suspect_id), face_id)
+        for face in added:
+            pipe.hset(SUSPECT_FACES_KEY.format(face["suspect_id"]), face["face_id"], orjson.dumps(face))
+        pipe.execute()
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao atualizar índice de suspeitos: {e}")
+        try:
+            redis_conn.delete(SUSPECTS_INDEX_READY_KEY)
+        except RedisError:
+            pass
+
+
+def invalidate_suspects_index():
+    """Descarta o índice inteiro; a próxima listagem o reconstrói a partir do Milvus."""
+    try:
+        keys = list(redis_conn.scan_iter(match=SUSPECT_FACES_PATTERN, count=1000))
+        redis_conn.delete(SUSPECTS_INDEX_READY_KEY, *keys)
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao invalidar índice de suspeitos: {e}")
+
+
+# ============================================================
+#  Versão dos dados de faces (ETag das listagens)
+# ============================================================
+def get_faces_version():
+    """
+    Retorna a versão atual das faces (muda a cada escrita).
+
+    Returns:
+        str | None: Versão, ou None se o Redis estiver indisponível.
+    """
+    try:
+        return (redis_conn.get(FACES_VERSION_KEY) or b"0").decode()
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao ler versão das faces: {e}")
+        return None
+
+
+def get_faces_etag_version():
+    """
+    Retorna a versão das faces que pode ser usada como ETag.
+
+    Logo após uma escrita (janela `FACES_STALENESS_WINDOW`), uma leitura
+    "Eventually" do Milvus ainda pode devolver dados anteriores a ela; nesse
+    caso não há versão segura para marcar a resposta.
+
+    Returns:
+        str | None: Versão, ou None (escrita recente ou Redis indisponível).
+    """
+    try:
+        version, recent = redis_conn.mget(FACES_VERSION_KEY, FACES_RECENT_WRITE_KEY)
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao ler versão das faces: {e}")
+        return None
+    if recent is not None:
+        return None
+    return (version or b"0").decode()
+
+
+def bump_faces_version():
+    """
+    Incrementa a versão das faces após qualquer escrita na collection e abre
+    a janela em que a versão não é usada como ETag.
+    """
+    try:
+        pipe = redis_conn.pipeline()
+        pipe.incr(FACES_VERSION_KEY)
+        pipe.set(FACES_RECENT_WRITE_KEY, 1, px=int(FACES_STALENESS_WINDOW * 1000))
+        pipe.execute()
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao incrementar versão das faces: {e}")
+
+
+# ============================================================
+#  Gerador de face_id
+# ============================================================
+def reserve_face_ids(count, seed_max_id):
+    """
+    Reserva `count` face_ids consecutivos com um INCRBY atômico.
+
+    Seguro entre processos (API e workers). Na primeira chamada, ou se o Redis
+    tiver perdido a chave, o contador é semeado com o maior face_id já
+    gravado (`SET NX`: só um processo semeia). Diferente dos caches deste
+    módulo, erros do Redis são propagados: sem o contador não há como gerar
+    IDs únicos.
+
+    Args:
+        count (int): Quantidade de IDs.
+        seed_max_id (Callable[[], int]): Retorna o maior face_id existente;
+            chamado só quando o contador ainda não existe.
+
+    Returns:
+        int: Primeiro ID reservado (os demais seguem em sequência).
+    """
+    if not redis_conn.exists(FACE_ID_KEY):
+        redis_conn.set(FACE_ID_KEY, int(seed_max_id()), nx=True)
+    return redis_conn.incrby(FACE_ID_KEY, count) - count + 1
+
+
+# ============================================================
+#  Cache de embeddings (imagens do S3 já processadas)
+# ============================================================
+def get_cached_embedding(etag):
+    """
+    Busca o embedding de uma imagem já processada pelo ETag do objeto no S3.
+
+    Args:
+        etag (str): ETag retornado pelo S3 no download.
+
+    Returns:
+        list[float] | None: Embedding em cache, ou None (ausente ou Redis indisponível).
+    """
+    try:
+        raw = redis_conn.get(EMBEDDING_CACHE_KEY.format(etag))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao ler embedding em cache: {e}")
+        return None
+    if raw is None:
+        return None
+    return np.frombuffer(raw, dtype="<f4").tolist()
+
+
+def cache_embedding(etag, embedding):
+    """Guarda o embedding (float32 little-endian) por `EMBEDDING_CACHE_TTL` segundos."""
+    try:
+        redis_conn.setex(
+            EMBEDDING_CACHE_KEY.format(etag),
+            EMBEDDING_CACHE_TTL,
+            np.asarray(embedding, dtype="<f4").tobytes()
+        )
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao gravar embedding em cache: {e}")
+
+
+def get_cached_detections(digest):
+    """
+    Busca as detecções de uma imagem já processada pelo hash do conteúdo.
+
+    Compartilhado entre API e workers: reenvios da mesma imagem (retries,
+    QA) não passam de novo pelo FaceNet em nenhum processo.
+
+    Args:
+        digest (str): blake2b (hex) dos bytes da imagem.
+
+    Returns:
+        list[dict] | None: Detecções com `embedding` em ndarray float32, ou
+        None (ausente ou Redis indisponível).
+    """
+    try:
+        raw = redis_conn.get(DETECTIONS_CACHE_KEY.format(digest))
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao ler detecções em cache: {e}")
+        return None
+    if raw is None:
+        return None
+
+    detections = job_serializer.loads(raw)
+    for det in detections:
+        det["embedding"] = np.frombuffer(det["embedding"], dtype="<f4")
+    return detections
+
+
+def cache_detections(digest, detections):
+    """Guarda as detecções (embeddings em float32 little-endian) por `EMBEDDING_CACHE_TTL` segundos."""
+    try:
+        redis_conn.set(
+            DETECTIONS_CACHE_KEY.format(digest),
+            job_serializer.dumps([
+                {**det, "embedding": np.asarray(det["embedding"], dtype="<f4").tobytes()}
+                for det in detections
+            ]),
+            ex=EMBEDDING_CACHE_TTL
+        )
+    except RedisError as e:
+        print(f"[Redis] ⚠️ Falha ao gravar detecções em cache: {e}")
@@ -0,0 +1,140 @@
+import threading
+import time
+from io import BytesIO
+
+import boto3
+import requests
+from botocore.config import Config
+from requests.adapters import HTTPAdapter
+
+import config
+
+# Cliente S3 compartilhado pelo processo (criado sob demanda)
+_S3_CLIENT = None
+_S3_LOCK = threading.Lock()
+
+# URLs pré-assinadas em cache: (bucket, key) -> (url, expira_em)
+PRESIGNED_TTL = 900
+URL_CACHE_MAX = 4096
+_URL_CACHE = {}
+_URL_LOCK = threading.Lock()
+
+# Sessão HTTP com pool de conexões (keep-alive) para os downloads
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(pool_connections=50, pool_maxsize=50))
+
+
+# ============================================================
+#  Caminhos s3://bucket/key
+# ============================================================
+def parse_s3_uri(s3_path):
+    """
+    Separa um caminho `s3://bucket/key` em bucket e key.
+
+    Args:
+        s3_path (str): Caminho no formato s3://bucket/key.
+
+    Returns:
+        tuple[str, str]: (bucket, key).
+
+    Raises:
+        ValueError: Se o caminho não seguir o formato ou faltar bucket/key.
+    """
+    if not s3_path or not s3_path.startswith("s3://"):
+        raise ValueError("Caminho S3 inválido. Use o formato s3://bucket/key")
+
+    bucket, _, key = s3_path[5:].partition("/")
+    if not bucket or not key:
+        raise ValueError("Caminho S3 inválido. Deve conter bucket e key")
+    return bucket, key
+
+
+# ============================================================
+#  Cliente S3 compartilhado
+# ============================================================
+def get_s3_client():
+    """
+    Retorna o cliente S3 compartilhado pelo processo, criando-o na primeira chamada.
+
+    A construção de um cliente boto3 carrega os modelos de serviço do botocore e
+    monta o estado de endpoint/assinatura, então o cliente é criado uma única vez
+    e reaproveitado (junto com seu pool de conexões HTTP) por todas as chamadas.
+
+    As credenciais vêm de `config.py`; quando ausentes (None), o boto3 usa a
+    cadeia padrão de credenciais (variáveis de ambiente, ~/.aws, IAM role).
+
+    Returns:
+        botocore.client.S3: Cliente S3 reutilizável e thread-safe.
+    """
+    global _S3_CLIENT
+    if _S3_CLIENT is None:
+        with _S3_LOCK:
+            if _S3_CLIENT is None:
+                _S3_CLIENT = boto3.client(
+                    "s3",
+                    aws_access_key_id=config.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
+                    region_name=config.AWS_REGION,
+                    config=Config(
+                        max_pool_connections=50,
+                        retries={"max_attempts": 3, "mode": "standard"},
+                        tcp_keepalive=True
+                    )
+                )
+                print("[S3] Cliente S3 criado.")
+    return _S3_CLIENT
+
+
+# ============================================================
+#  Download de objetos
+# ============================================================
+def _presigned_get_url(bucket, key):
+    """
+    Retorna uma URL GET pré-assinada para o objeto, reaproveitando a URL em
+    cache enquanto faltarem mais de 30s para expirar. Assim a assinatura
+    SigV4 é calculada uma vez por objeto a cada `PRESIGNED_TTL` segundos.
+    """
+    now = time.time()
+    with _URL_LOCK:
+        url, expires = _URL_CACHE.get((bucket, key), (None, 0))
+    if url is None or now > expires - 30:
+        url = get_s3_client().generate_presigned_url(
+            "get_object",
+            Params={"Bucket": bucket, "Key": key},
+            ExpiresIn=PRESIGNED_TTL
+        )
+        with _URL_LOCK:
+            if len(_URL_CACHE) >= URL_CACHE_MAX:
+                # descarta entradas expiradas (ou tudo, se nenhuma expirou)
+                expired = [k for k, (_, exp) in _URL_CACHE.items() if exp <= now]
+                for k in expired or list(_URL_CACHE):
+                    del _URL_CACHE[k]
+            _URL_CACHE[(bucket, key)] = (url, now + PRESIGNED_TTL)
+    return url
+
+
+def download_s3_object(bucket, key):
+    """
+    Baixa um objeto do S3 para um buffer em memória.
+
+    O download usa uma URL pré-assinada (em cache por objeto) e a sessão HTTP
+    compartilhada, reaproveitando conexões TLS entre chamadas.
+
+    Args:
+        bucket (str): Nome do bucket.
+        key (str): Chave do objeto.
+
+    Returns:
+        BytesIO: Buffer posicionado no início, com `name` igual ao nome do
+        arquivo e `etag` igual ao ETag do objeto (None se ausente).
+
+    Raises:
+        requests.HTTPError: Se o S3 responder com erro (ex.: objeto inexistente).
+    """
+    response = _SESSION.get(_presigned_get_url(bucket, key), timeout=10)
+    response.raise_for_status()
+
+    buffer = BytesIO(response.content)
+    buffer.name = key.split("/")[-1]  # nome do arquivo, útil se o modelo usa extensão
+    buffer.etag = response.headers.get("ETag")  # hash do conteúdo, chave do cache de embeddings
+    return buffer
@@ -3,7 +3,11 @@ from unittest.mock import Mock, patch, MagicMock
 import numpy as np
 from io import BytesIO
 from PIL import Image
-from app.services.embeddings_service import generate_embeddings, compare_embeddings
+from app.services.embeddings_service import (
+    generate_embeddings, compare_embeddings, encode_embedding, decode_embedding,
+    sniff_image, extract_faces, extract_faces_batch, _DETECTIONS_CACHE, MAX_DECODE_SIZE,
+    _save_processed_image, wait_processed_image, detect_and_search_faces
+)
 
 
 @pytest.fixture
@@ -108,3 +112,158 @@ def test_compare_embeddings_extraction_fails(mock_image_file):
         
         assert status == 400
         assert "error" in result
+
+
+def test_encode_decode_embedding_roundtrip():
+    """Testa que o embedding em base64 volta ao mesmo vetor float32"""
+    embedding = np.random.rand(512).astype(np.float32)
+
+    encoded = encode_embedding(embedding.tolist())
+
+    assert encoded["dtype"] == "float32"
+    assert encoded["dim"] == 512
+    np.testing.assert_array_equal(decode_embedding(encoded["embedding_b64"]), embedding)
+
+
+def test_sniff_image():
+    """Testa a identificação do formato pelos magic bytes"""
+    assert sniff_image(b"\xff\xd8\xff\xe0" + b"\x00" * 12) == "jpeg"
+    assert sniff_image(b"\x89PNG\r\n\x1a\n" + b"\x00" * 8) == "png"
+    assert sniff_image(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "webp"
+    assert sniff_image(b"<html><body>") is None
+    assert sniff_image(b"") is None
+
+
+def test_extract_faces_cached_by_content():
+    """Testa que a mesma imagem não passa duas vezes pelo modelo"""
+    _DETECTIONS_CACHE.clear()
+    img_bytes = BytesIO()
+    Image.new('RGB', (160, 160), color='blue').save(img_bytes, format='PNG')
+    data = img_bytes.getvalue()
+
+    model = Mock()
+    model.extract.return_value = [{"embedding": [0.1] * 512, "box": [1, 2, 3, 4]}]
+    with patch('app.services.embeddings_service.get_facenet_model', return_value=model), \
+         patch('app.services.embeddings_service.get_cached_detections', return_value=None), \
+         patch('app.services.embeddings_service.cache_detections') as mock_cache:
+        _, first, _ = extract_faces(BytesIO(data))
+        image_np, second, _ = extract_faces(BytesIO(data))
+
+    model.extract.assert_called_once()
+    mock_cache.assert_called_once()
+    assert second is first
+    assert image_np.shape == (160, 160, 3)
+    _DETECTIONS_CACHE.clear()
+
+
+def test_extract_faces_uses_shared_cache():
+    """Testa que detecções já no Redis (outro processo) dispensam o modelo"""
+    _DETECTIONS_CACHE.clear()
+    img_bytes = BytesIO()
+    Image.new('RGB', (160, 160), color='red').save(img_bytes, format='PNG')
+    cached = [{"embedding": np.zeros(512, dtype=np.float32), "box": [1, 2, 3, 4]}]
+
+    model = Mock()
+    with patch('app.services.embeddings_service.get_facenet_model', return_value=model), \
+         patch('app.services.embeddings_service.get_cached_detections', return_value=cached):
+        _, detections, _ = extract_faces(BytesIO(img_bytes.getvalue()))
+
+    model.extract.assert_not_called()
+    assert detections is cached
+    _DETECTIONS_CACHE.clear()
+
+
+def test_extract_faces_reduces_large_jpeg():
+    """Testa que JPEGs grandes são decodificados reduzidos, com caixas nas coordenadas da imagem original"""
+    _DETECTIONS_CACHE.clear()
+    img_bytes = BytesIO()
+    Image.new('RGB', (MAX_DECODE_SIZE * 4, MAX_DECODE_SIZE * 3), color='green').save(img_bytes, format='JPEG')
+
+    model = Mock()
+    model.extract.return_value = [{"embedding": [0.1] * 512, "box": [100, 200, 50, 60]}]
+    with patch('app.services.embeddings_service.get_facenet_model', return_value=model), \
+         patch('app.services.embeddings_service.get_cached_detections', return_value=None), \
+         patch('app.services.embeddings_service.cache_detections') as mock_cache:
+        image_np, detections, scale = extract_faces(BytesIO(img_bytes.getvalue()))
+
+    assert max(image_np.shape[:2]) >= MAX_DECODE_SIZE
+    assert max(image_np.shape[:2]) < MAX_DECODE_SIZE * 4
+    assert image_np.shape[1] * scale == MAX_DECODE_SIZE * 4
+    assert detections[0]["box"] == [100 * scale, 200 * scale, 50 * scale, 60 * scale]
+    assert mock_cache.call_args[0][1][0]["box"] == detections[0]["box"]
+    _DETECTIONS_CACHE.clear()
+
+
+def test_extract_faces_batch_single_inference():
+    """Testa que os rostos de várias imagens passam por uma única inferência do FaceNet"""
+    _DETECTIONS_CACHE.clear()
+    images = []
+    for color in ('red', 'green'):
+        img_bytes = BytesIO()
+        Image.new('RGB', (160, 160), color=color).save(img_bytes, format='PNG')
+        images.append(img_bytes.getvalue())
+
+    model = Mock()
+    model.crop.side_effect = [
+        ([{"box": [1, 2, 3, 4]}], ["crop-a"]),
+        ([{"box": [5, 6, 7, 8]}, {"box": [9, 9, 9, 9]}], ["crop-b", "crop-c"])
+    ]
+    model.embeddings.return_value = np.arange(3 * 4, dtype=np.float32).reshape(3, 4)
+    with patch('app.services.embeddings_service.get_facenet_model', return_value=model), \
+         patch('app.services.embeddings_service.get_cached_detections', return_value=None), \
+         patch('app.services.embeddings_service.cache_detections'):
+        (_, first, _), (_, second, _) = extract_faces_batch([BytesIO(images[0]), BytesIO(images[1])])
+
+    model.embeddings.assert_called_once_with(images=["crop-a", "crop-b", "crop-c"])
+    model.extract.assert_not_called()
+    assert [d["box"] for d in second] == [[5, 6, 7, 8], [9, 9, 9, 9]]
+    np.testing.assert_array_equal(first[0]["embedding"], [0, 1, 2, 3])
+    np.testing.assert_array_equal(second[1]["embedding"], [8, 9, 10, 11])
+    _DETECTIONS_CACHE.clear()
+
+
+def test_save_processed_image_runs_in_background(tmp_path, monkeypatch):
+    """Testa que a gravação sai da thread da requisição e `wait_processed_image` aguarda o arquivo"""
+    import threading
+    monkeypatch.chdir(tmp_path)
+    release = threading.Event()
+
+    def slow_save(image_np, save_path):
+        release.wait(5)
+        Image.fromarray(image_np).save(save_path)
+
+    image_np = np.zeros((40, 40, 3), dtype=np.uint8)
+    with patch('app.services.embeddings_service._encode_and_save', side_effect=slow_save):
+        save_path = _save_processed_image(image_np, [[5, 5, 10, 10]], BytesIO(), "_processed", "image.jpg")
+        assert not (tmp_path / save_path).exists()
+        release.set()
+        assert wait_processed_image(save_path, timeout=5) == save_path
+
+    assert (tmp_path / save_path).exists()
+    assert image_np[5, 5].tolist() == [255, 0, 0]
+
+
+def test_wait_processed_image_hides_failed_save(tmp_path, monkeypatch):
+    """Testa que uma gravação com falha não devolve o caminho ao cliente"""
+    monkeypatch.chdir(tmp_path)
+    image_np = np.zeros((40, 40, 3), dtype=np.uint8)
+    with patch('app.services.embeddings_service._encode_and_save', side_effect=OSError("disco cheio")):
+        save_path = _save_processed_image(image_np, [], BytesIO(), "_processed", "falha.jpg")
+        assert wait_processed_image(save_path, timeout=5) is None
+
+    assert wait_processed_image(None) is None
+
+
+def test_detect_and_search_faces_encodes_in_memory(mock_image_file):
+    """Testa que `encode_image` devolve o JPEG processado em bytes sem gravar em disco"""
+    detections = [{"box": [10, 20, 30, 40], "embedding": np.zeros(128, dtype=np.float32)}]
+    image_np = np.zeros((160, 160, 3), dtype=np.uint8)
+    with patch('app.services.embeddings_service.extract_faces', return_value=(image_np, detections, 1)), \
+         patch('app.services.embeddings_service.search_similar_faces_batch', return_value=[[{"distance": 0.3}]]), \
+         patch('app.services.embeddings_service._save_processed_image') as mock_save:
+        result, status = detect_and_search_faces(mock_image_file, encode_image=True)
+
+    assert status == 200
+    mock_save.assert_not_called()
+    assert result["processed_image_path"] is None
+    assert sniff_image(result["processed_image_bytes"][:16]) == "jpeg"
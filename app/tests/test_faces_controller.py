@@ -0,0 +1,37 @@
+from base64 import b64encode
+from unittest.mock import Mock, patch
+from rq.job import JobStatus
+from rq.results import Result
+from app.controllers.faces_controller import _latest_results, _job_payload_with_result
+from app.services.redis_service import job_serializer
+
+
+def _job(job_id, status):
+    job = Mock(id=job_id, started_at=None, ended_at=None)
+    job.get_status.return_value = status
+    return job
+
+
+def test_latest_results_single_pipeline():
+    """Testa que os resultados de vários jobs concluídos vêm de um único pipeline"""
+    jobs = [_job("a", JobStatus.FINISHED), _job("b", JobStatus.QUEUED), None, _job("c", JobStatus.FINISHED)]
+    payload = {
+        b"type": str(Result.Type.SUCCESSFUL.value).encode(),
+        b"return_value": b64encode(job_serializer.dumps({"faces_count": 2}))
+    }
+    with patch('app.controllers.faces_controller.redis_conn') as mock_redis:
+        pipe = Mock()
+        pipe.execute.return_value = [[(b"1700000000000-0", payload)], []]
+        mock_redis.pipeline.return_value = pipe
+
+        latest = _latest_results(jobs)
+
+    pipe.execute.assert_called_once()
+    assert [c.args[0] for c in pipe.xrevrange.call_args_list] == ["rq:results:a", "rq:results:c"]
+    assert latest["c"] is None
+    body, status = _job_payload_with_result(jobs[0], latest["a"])
+    assert status == 200
+    assert body["result"] == {"faces_count": 2}
+    for job in jobs:
+        if job is not None:
+            job.latest_result.assert_not_called()
@@ -3,12 +3,40 @@ from unittest.mock import Mock, patch, MagicMock
 import numpy as np
 from app.services.milvus_service import (
     insert_face,
+    insert_faces,
+    max_face_id,
     search_similar_faces,
+    search_similar_faces_batch,
     create_collection_if_not_exists,
-    connect_milvus
+    connect_milvus,
+    get_collection,
+    reset_collection_cache,
+    set_collection_exists,
+    has_collection_cached,
+    build_expr,
+    SUSPECT_FACES_EXPR,
+    FACE_EXPR,
+    FacesBatcher,
+    get_suspect_metadata,
+    invalidate_suspect_metadata,
+    query_faces_by_ids,
+    delete_faces_by_ids,
+    delete_faces_by_suspects,
+    _keepalive_loop,
+    warmup_search,
+    MAX_IN_LIST,
+    SEARCH_PARAMS
 )
 
 
+@pytest.fixture(autouse=True)
+def clear_collection_cache():
+    """Garante que cada teste parte sem handle/existência em cache"""
+    reset_collection_cache()
+    yield
+    reset_collection_cache()
+
+
 @pytest.fixture
 def mock_embedding():
     """Cria um embedding mock"""
@@ -71,12 +99,11 @@ def test_create_collection_already_exists():
 
 def test_insert_face_success(mock_embedding):
     """Testa inserção de face com sucesso"""
-    with patch('app.services.milvus_service.connect_milvus'):
-        with patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create:
+    with patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create, \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=6) as mock_reserve:
+        with patch('app.services.milvus_service.get_collection') as mock_get:
             mock_collection = Mock()
-            mock_collection.num_entities = 5
-            mock_collection.indexes = [Mock()]
-            mock_create.return_value = mock_collection
+            mock_get.return_value = mock_collection
             
             result = insert_face(
                 suspect_id=123,
@@ -87,19 +114,24 @@ def test_insert_face_success(mock_embedding):
             )
             
             assert result is not None
-            assert result == 6  # num_entities + 1
+            assert result == 6  # próximo ID do contador
+            assert mock_reserve.call_args.args[0] == 1
             mock_collection.insert.assert_called_once()
-            mock_collection.flush.assert_called_once()
+            mock_collection.flush.assert_not_called()
+            mock_create.assert_not_called()
+            inserted = mock_collection.insert.call_args[0][0]
+            assert inserted[0]["metadata"] == '{"name":"John"}'
+            assert inserted[0]["face_id"] == 6
+            assert isinstance(inserted[0]["embedding"][0], float)
 
 
 def test_insert_face_with_none_suspect_id(mock_embedding):
     """Testa inserção com suspect_id None"""
-    with patch('app.services.milvus_service.connect_milvus'):
-        with patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create:
+    with patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create, \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=6) as mock_reserve:
+        with patch('app.services.milvus_service.get_collection') as mock_get:
             mock_collection = Mock()
-            mock_collection.num_entities = 5
-            mock_collection.indexes = [Mock()]
-            mock_create.return_value = mock_collection
+            mock_get.return_value = mock_collection
             
             result = insert_face(
                 suspect_id=None,
@@ -111,61 +143,385 @@ def test_insert_face_with_none_suspect_id(mock_embedding):
             mock_collection.insert.assert_called_once()
 
 
+def test_insert_face_creates_missing_collection(mock_embedding):
+    """Testa que o primeiro registro cria a collection e usa o handle compartilhado"""
+    mock_collection = Mock()
+    with patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create, \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=1), \
+            patch('app.services.milvus_service.get_collection', side_effect=[None, mock_collection]):
+        assert insert_face(suspect_id=1, embedding=mock_embedding) == 1
+
+    mock_create.assert_called_once_with(dim=len(mock_embedding))
+    mock_collection.insert.assert_called_once()
+
+def test_insert_faces_after_stale_negative_cache():
+    """Testa o insert quando o cache diz "não existe" mas outro processo já criou a collection"""
+    set_collection_exists(False)
+    mock_collection = Mock()
+    with patch('app.services.milvus_service.connect_milvus'), \
+            patch('app.services.milvus_service.connections.has_connection', return_value=True), \
+            patch('app.services.milvus_service.utility.has_collection', return_value=True), \
+            patch('app.services.milvus_service.Collection', return_value=mock_collection), \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=7), \
+            patch('app.services.milvus_service.bump_faces_version'), \
+            patch('app.services.milvus_service.rebuild_suspects_index'):
+        assert insert_faces([{"suspect_id": 1, "embedding": [0.1] * 4}]) == [7]
+
+    mock_collection.create_index.assert_not_called()
+    mock_collection.insert.assert_called_once()
+
+
+def test_insert_faces_raises_when_collection_unavailable():
+    """Testa erro claro (e não AttributeError) se a collection segue indisponível"""
+    with patch('app.services.milvus_service.create_collection_if_not_exists'), \
+            patch('app.services.milvus_service.get_collection', return_value=None):
+        with pytest.raises(Exception, match="indisponível"):
+            insert_faces([{"suspect_id": 1, "embedding": [0.1] * 4}])
+
+
+def test_insert_faces_recovers_from_dropped_collection():
+    """Testa que um handle em cache de collection removida em outro processo é descartado e o insert refeito"""
+    from pymilvus.exceptions import MilvusException
+
+    stale, fresh = Mock(), Mock()
+    stale.insert.side_effect = MilvusException(code=100, message="collection not found[collection=faces]")
+    with patch('app.services.milvus_service.get_collection', side_effect=[stale, None, fresh]), \
+            patch('app.services.milvus_service.create_collection_if_not_exists') as mock_create, \
+            patch('app.services.milvus_service.reset_collection_cache') as mock_reset, \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=1), \
+            patch('app.services.milvus_service.bump_faces_version'), \
+            patch('app.services.milvus_service.rebuild_suspects_index'):
+        assert insert_faces([{"suspect_id": 1, "embedding": [0.1] * 4}]) == [1]
+
+    mock_reset.assert_called_once()
+    mock_create.assert_called_once_with(dim=4)
+    fresh.insert.assert_called_once()
+
+
+def test_search_similar_faces_batch_refreshes_dropped_collection():
+    """Testa que a busca renova o handle de uma collection removida em outro processo"""
+    from pymilvus.exceptions import MilvusException
+
+    stale, fresh = Mock(), Mock()
+    stale.search.side_effect = MilvusException(code=100, message="collection not found[collection=faces]")
+    fresh.search.return_value = [[]]
+    with patch('app.services.milvus_service.get_collection', side_effect=[stale, fresh]), \
+            patch('app.services.milvus_service.reset_collection_cache') as mock_reset:
+        assert search_similar_faces_batch([[0.1] * 4]) == [[]]
+
+    mock_reset.assert_called_once()
+    fresh.search.assert_called_once()
+
+
+def test_insert_faces_single_rpc():
+    """Testa que várias faces vão em um único insert, com IDs consecutivos e sem flush"""
+    mock_collection = Mock()
+    faces = [
+        {"suspect_id": 1, "embedding": np.zeros(4, dtype=np.float32)},
+        {"suspect_id": 2, "embedding": [0.5] * 4, "is_query": True},
+        {"suspect_id": 3, "embedding": [0.1] * 4, "metadata": {"a": 1}}
+    ]
+    with patch('app.services.milvus_service.get_collection', return_value=mock_collection), \
+            patch('app.services.milvus_service.reserve_face_ids', return_value=11) as mock_reserve, \
+            patch('app.services.milvus_service.rebuild_suspects_index') as mock_index:
+        ids = insert_faces(faces)
+
+    assert ids == [11, 12, 13]
+    assert mock_reserve.call_args.args[0] == 3
+    mock_collection.insert.assert_called_once()
+    mock_collection.flush.assert_not_called()
+    mock_collection.load.assert_not_called()
+    indexed = mock_index.call_args.args[0]
+    assert [face["face_id"] for face in indexed] == [11, 13]
+    assert mock_index.call_args.kwargs == {"complete": False}
+
+def test_max_face_id_scans_primary_keys():
+    """Testa o maior face_id lido em lotes pelo iterator (semente do contador)"""
+    iterator = Mock()
+    iterator.next.side_effect = [[{"face_id": 3}, {"face_id": 9}], [{"face_id": 4}], []]
+    collection = Mock()
+    collection.query_iterator.return_value = iterator
+
+    assert max_face_id(collection) == 9
+    assert collection.query_iterator.call_args.kwargs["output_fields"] == ["face_id"]
+    iterator.close.assert_called_once()
+
 def test_search_similar_faces_success(mock_embedding):
     """Testa busca de faces semelhantes"""
-    with patch('app.services.milvus_service.connect_milvus'):
-        with patch('app.services.milvus_service.utility.has_collection') as mock_has:
-            with patch('app.services.milvus_service.Collection') as mock_collection_class:
-                mock_has.return_value = True
-                mock_collection = Mock()
-                mock_collection.query.return_value = [
-                    {"face_id": 1},
-                    {"face_id": 2},
-                    {"face_id": 3}
-                ]
-                
-                mock_hit = Mock()
-                mock_hit.id = 1
-                mock_hit.distance = 0.15
-                mock_hit.entity.get.return_value = 123
-                mock_collection.search.return_value = [[mock_hit]]
-                
-                mock_collection_class.return_value = mock_collection
-                
-                result = search_similar_faces(mock_embedding, top_k=3)
-                
-                assert isinstance(result, list)
-                mock_collection.query.assert_called_once()
-                mock_collection.search.assert_called_once()
+    with patch('app.services.milvus_service.get_collection') as mock_get:
+        mock_collection = Mock()
+
+        mock_hit = Mock()
+        mock_hit.id = 1
+        mock_hit.distance = 0.15
+        mock_hit.entity.get.return_value = 123
+        mock_collection.search.return_value = [[mock_hit]]
+
+        mock_get.return_value = mock_collection
+
+        result = search_similar_faces(mock_embedding, top_k=3)
+
+        assert isinstance(result, list)
+        mock_collection.query.assert_not_called()
+        mock_collection.load.assert_not_called()
+        mock_collection.search.assert_called_once()
+        assert mock_collection.search.call_args.kwargs["expr"] == "is_query == false"
+
+
+def test_search_similar_faces_batch_single_rpc():
+    """Testa que vários embeddings são buscados em uma única chamada de search"""
+    embeddings = [np.random.rand(512).tolist() for _ in range(3)]
+
+    def hit(face_id, distance):
+        h = Mock(id=face_id, distance=distance)
+        h.entity.get.side_effect = {"is_query": False, "suspect_id": face_id * 10}.get
+        return h
+
+    with patch('app.services.milvus_service.get_collection') as mock_get:
+        mock_collection = Mock()
+        mock_collection.search.return_value = [[hit(1, 0.1)], [], [hit(2, 0.4), hit(1, 0.9)]]
+        mock_get.return_value = mock_collection
+
+        result = search_similar_faces_batch(embeddings, top_k=2)
+
+        mock_collection.search.assert_called_once()
+        assert mock_collection.search.call_args.kwargs["data"] == embeddings
+        assert [len(matches) for matches in result] == [1, 0, 2]
+        assert result[2][0] == {"face_id": 2, "suspect_id": 20, "distance": 0.4}
 
 
 def test_search_similar_faces_no_registered():
     """Testa busca quando não há faces registradas"""
     mock_embedding = np.random.rand(512).tolist()
     
-    with patch('app.services.milvus_service.connect_milvus'):
-        with patch('app.services.milvus_service.utility.has_collection') as mock_has:
-            with patch('app.services.milvus_service.Collection') as mock_collection_class:
-                mock_has.return_value = True
-                mock_collection = Mock()
-                mock_collection.query.return_value = []
-                mock_collection_class.return_value = mock_collection
-                
-                result = search_similar_faces(mock_embedding)
-                
-                assert result == []
-                mock_collection.query.assert_called_once()
+    with patch('app.services.milvus_service.get_collection') as mock_get:
+        mock_collection = Mock()
+        mock_collection.search.return_value = [[]]
+        mock_get.return_value = mock_collection
+
+        result = search_similar_faces(mock_embedding)
+
+        assert result == []
+        mock_collection.query.assert_not_called()
 
 
 def test_search_similar_faces_collection_not_exists():
     """Testa busca quando collection não existe"""
     mock_embedding = np.random.rand(512).tolist()
     
+    with patch('app.services.milvus_service.get_collection', return_value=None):
+        with pytest.raises(Exception) as exc_info:
+            search_similar_faces(mock_embedding)
+
+        assert "não existe" in str(exc_info.value)
+
+
+def test_get_collection_cached():
+    """Testa que a collection é carregada uma única vez e reutilizada"""
+    reset_collection_cache()
+    with patch('app.services.milvus_service.connect_milvus') as mock_connect, \
+            patch('app.services.milvus_service.connections.has_connection', return_value=True), \
+            patch('app.services.milvus_service.utility.has_collection') as mock_has, \
+            patch('app.services.milvus_service.Collection') as mock_collection_class:
+        mock_has.return_value = True
+        mock_collection = Mock()
+        mock_collection_class.return_value = mock_collection
+
+        first = get_collection()
+        second = get_collection()
+
+        assert first is second
+        mock_connect.assert_called_once()
+        mock_collection.load.assert_called_once()
+    reset_collection_cache()
+
+
+def test_get_collection_reconnects_when_connection_lost():
+    """Testa que o handle em cache reconecta se a conexão foi encerrada"""
+    with patch('app.services.milvus_service.connect_milvus') as mock_connect, \
+            patch('app.services.milvus_service.connections.has_connection') as mock_has_conn, \
+            patch('app.services.milvus_service.utility.has_collection', return_value=True), \
+            patch('app.services.milvus_service.Collection') as mock_collection_class:
+        mock_collection = Mock()
+        mock_collection_class.return_value = mock_collection
+
+        mock_has_conn.return_value = True
+        get_collection()
+        mock_has_conn.return_value = False
+        assert get_collection() is mock_collection
+
+        assert mock_connect.call_count == 2
+        mock_collection.load.assert_called_once()
+
+
+def test_get_collection_not_exists():
+    """Testa get_collection quando a collection não existe"""
+    reset_collection_cache()
     with patch('app.services.milvus_service.connect_milvus'):
         with patch('app.services.milvus_service.utility.has_collection') as mock_has:
             mock_has.return_value = False
-            
-            with pytest.raises(Exception) as exc_info:
-                search_similar_faces(mock_embedding)
-            
-            assert "não existe" in str(exc_info.value)
+
+            assert get_collection() is None
+
+
+def test_has_collection_cached_reuses_result():
+    """Testa que o resultado (inclusive negativo) de has_collection é reaproveitado"""
+    with patch('app.services.milvus_service.utility.has_collection') as mock_has:
+        mock_has.return_value = False
+
+        assert has_collection_cached() is False
+        assert has_collection_cached() is False
+        mock_has.assert_called_once()
+
+        reset_collection_cache()
+        mock_has.return_value = True
+        assert has_collection_cached() is True
+        assert mock_has.call_count == 2
+
+
+def test_build_expr_coerces_to_int():
+    """Testa que os filtros só aceitam parâmetros inteiros"""
+    assert build_expr(SUSPECT_FACES_EXPR, sid="42") == "is_query == false and suspect_id == 42"
+
+    with pytest.raises(ValueError):
+        build_expr(FACE_EXPR, fid="1 or face_id > 0")
+
+
+def test_faces_batcher_merges_concurrent_suspects():
+    """Testa que consultas pendentes viram uma única query com `suspect_id in`"""
+    from concurrent.futures import Future
+
+    batcher = FacesBatcher()
+    collection = Mock()
+    collection.query.return_value = [
+        {"face_id": 1, "suspect_id": 7},
+        {"face_id": 2, "suspect_id": 9},
+        {"face_id": 3, "suspect_id": 7}
+    ]
+    futures = {sid: Future() for sid in (7, 9, 11)}
+    fields = tuple(FacesBatcher.OUTPUT_FIELDS)
+
+    with patch('app.services.milvus_service.get_collection', return_value=collection):
+        batcher._process([(sid, fields, future) for sid, future in futures.items()])
+
+    collection.query.assert_called_once()
+    assert collection.query.call_args.kwargs["expr"] == "is_query == false and suspect_id in [7, 9, 11]"
+    assert [f["face_id"] for f in futures[7].result()] == [1, 3]
+    assert futures[9].result() == [{"face_id": 2, "suspect_id": 9}]
+    assert futures[11].result() == []
+
+
+def test_faces_batcher_slow_query_does_not_block_next_batch():
+    """Testa que uma query lenta em andamento não segura o lote seguinte"""
+    import threading
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_query(**kwargs):
+        started.set()
+        release.wait(5)
+        return []
+
+    slow = Mock()
+    slow.query.side_effect = slow_query
+    fast = Mock()
+    fast.query.return_value = [{"face_id": 5, "suspect_id": 9}]
+
+    batcher = FacesBatcher(window=0)
+    results = {}
+    with patch('app.services.milvus_service.get_collection', side_effect=[slow, fast]):
+        waiting = threading.Thread(target=lambda: results.update(slow=batcher.get(7, timeout=5)))
+        waiting.start()
+        started.wait(5)
+        results["fast"] = batcher.get(9, timeout=2)
+        release.set()
+        waiting.join(5)
+
+    assert results["fast"] == [{"face_id": 5, "suspect_id": 9}]
+    assert results["slow"] == []
+
+
+def test_get_suspect_metadata_cached():
+    """Testa que os metadados do suspeito vêm do cache até serem invalidados"""
+    invalidate_suspect_metadata()
+    faces = [
+        {"face_id": 1, "timestamp": 10, "metadata": '{"nome": "antigo"}'},
+        {"face_id": 2, "timestamp": 20, "metadata": '{"nome": "Maria"}'}
+    ]
+    with patch('app.services.milvus_service.faces_batcher') as mock_batcher:
+        mock_batcher.get.side_effect = lambda *args, **kwargs: [dict(f) for f in faces]
+
+        assert get_suspect_metadata(7) == {"nome": "Maria"}
+        assert get_suspect_metadata(7) == {"nome": "Maria"}
+        mock_batcher.get.assert_called_once()
+
+        invalidate_suspect_metadata(7)
+        get_suspect_metadata(7)
+        assert mock_batcher.get.call_count == 2
+    invalidate_suspect_metadata()
+
+
+def test_query_faces_by_ids_chunks_in_lists():
+    """Testa que listas grandes de IDs são divididas em blocos de MAX_IN_LIST"""
+    collection = Mock()
+    collection.query.side_effect = lambda expr, output_fields: [{"face_id": 0}]
+
+    rows = query_faces_by_ids(collection, range(MAX_IN_LIST + 10), ["face_id"])
+
+    assert collection.query.call_count == 2
+    assert len(rows) == 2
+    assert collection.query.call_args.kwargs["expr"].startswith(f"face_id in [{MAX_IN_LIST}, ")
+
+
+def test_delete_faces_by_ids_sums_chunks():
+    """Testa a remoção pela chave primária em blocos, somando as linhas removidas"""
+    collection = Mock()
+    collection.delete.return_value = Mock(delete_count=3)
+
+    deleted = delete_faces_by_ids(collection, [1, 2, 2] + list(range(10, MAX_IN_LIST + 10)))
+
+    assert collection.delete.call_count == 2
+    assert deleted == 6
+    assert collection.delete.call_args_list[0].kwargs["expr"].startswith("face_id in [1, 2, 10, ")
+
+
+def test_delete_faces_by_suspects_single_filter():
+    """Testa a remoção de vários suspeitos com um único filtro `suspect_id in`"""
+    collection = Mock()
+    collection.delete.return_value = Mock(delete_count=5)
+
+    deleted = delete_faces_by_suspects(collection, [7, 8, 7])
+
+    collection.delete.assert_called_once_with(expr="suspect_id in [7, 8]")
+    assert deleted == 5
+
+
+def test_warmup_search_uses_schema_dim():
+    """Testa que o aquecimento busca um vetor nulo com a dimensão do schema"""
+    field = Mock(params={"dim": 4})
+    field.name = "embedding"
+    collection = Mock()
+    collection.schema.fields = [field]
+
+    warmup_search(collection)
+
+    kwargs = collection.search.call_args.kwargs
+    assert kwargs["data"] == [[0.0] * 4]
+    assert kwargs["param"] is SEARCH_PARAMS
+    assert kwargs["limit"] == 1
+
+
+def test_keepalive_reloads_only_unloaded_collection():
+    """Testa que o keep-alive só refaz o load() quando a collection foi descarregada"""
+    from pymilvus.client.types import LoadState
+    collection = Mock()
+    stop = Mock()
+    stop.wait.side_effect = [False, False, True]
+
+    with patch('app.services.milvus_service._keepalive_stop', stop), \
+         patch('app.services.milvus_service.get_collection', return_value=collection), \
+         patch('app.services.milvus_service.utility.load_state',
+               side_effect=[LoadState.Loaded, LoadState.NotLoad]):
+        _keepalive_loop()
+
+    collection.load.assert_called_once()
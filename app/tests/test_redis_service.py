@@ -0,0 +1,232 @@
+import numpy as np
+import orjson
+from unittest.mock import Mock, patch
+from redis.exceptions import RedisError
+from app.services.redis_service import (
+    index_suspect_face,
+    get_indexed_suspects,
+    iter_indexed_suspects,
+    get_faces_version,
+    get_faces_etag_version,
+    bump_faces_version,
+    get_cached_embedding,
+    cache_embedding,
+    get_cached_detections,
+    cache_detections,
+    job_serializer,
+    reserve_face_ids,
+    reindex_suspect_faces,
+    begin_suspects_index_rebuild,
+    finish_suspects_index_rebuild,
+    FACES_VERSION_KEY,
+    SUSPECTS_REBUILD_KEY,
+    FACE_ID_KEY,
+    SUSPECTS_INDEX_READY_KEY,
+    EMBEDDING_CACHE_TTL
+)
+
+
+def test_get_indexed_suspects_cold():
+    """Testa que o índice frio retorna None (forçando o fallback ao Milvus)"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.exists.return_value = 0
+
+        assert get_indexed_suspects() is None
+        mock_redis.exists.assert_called_once_with(SUSPECTS_INDEX_READY_KEY)
+
+
+def test_get_indexed_suspects_groups_faces():
+    """Testa a leitura do índice agrupando as faces por suspeito"""
+    face = {"face_id": 1, "suspect_id": 7, "timestamp": 0, "metadata": "{}", "s3_path": ""}
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.exists.return_value = 1
+        mock_redis.scan_iter.return_value = ["suspect:7:faces"]
+        pipe = Mock()
+        pipe.execute.return_value = [{b"1": orjson.dumps(face)}]
+        mock_redis.pipeline.return_value = pipe
+
+        result = get_indexed_suspects()
+
+        assert result == {7: [face]}
+
+
+def test_index_suspect_face_redis_down():
+    """Testa que falhas no Redis não interrompem o registro"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.hset.side_effect = RedisError("down")
+
+        index_suspect_face(7, {"face_id": 1, "suspect_id": 7})
+
+
+def test_iter_indexed_suspects_reads_in_chunks():
+    """Testa que o índice é lido em pipelines de `chunk` suspeitos"""
+    faces = [{"face_id": i, "suspect_id": i} for i in range(3)]
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.scan_iter.return_value = [f"suspect:{i}:faces" for i in range(3)]
+        pipe = Mock()
+        pipe.execute.side_effect = [
+            [{b"0": orjson.dumps(faces[0])}, {b"1": orjson.dumps(faces[1])}],
+            [{b"2": orjson.dumps(faces[2])}]
+        ]
+        mock_redis.pipeline.return_value = pipe
+
+        result = list(iter_indexed_suspects(chunk=2))
+
+        assert result == [(i, [faces[i]]) for i in range(3)]
+        assert pipe.execute.call_count == 2
+
+
+def test_get_faces_version():
+    """Testa a leitura da versão das faces (ETag) e o fallback sem Redis"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.get.return_value = None
+        assert get_faces_version() == "0"
+
+        mock_redis.get.return_value = b"42"
+        assert get_faces_version() == "42"
+
+        mock_redis.get.side_effect = RedisError("down")
+        assert get_faces_version() is None
+
+
+def test_faces_etag_version_skips_recent_writes():
+    """Testa que não há versão para ETag dentro da janela após uma escrita"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        pipe = Mock()
+        mock_redis.pipeline.return_value = pipe
+        bump_faces_version()
+        pipe.incr.assert_called_once_with(FACES_VERSION_KEY)
+        assert pipe.set.call_args.kwargs["px"] > 0
+
+        mock_redis.mget.return_value = [b"43", b"1"]
+        assert get_faces_etag_version() is None
+
+        mock_redis.mget.return_value = [b"43", None]
+        assert get_faces_etag_version() == "43"
+
+
+def test_cache_embedding_roundtrip():
+    """Testa que o embedding volta do cache como lista float32"""
+    store = {}
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.setex.side_effect = lambda key, ttl, value: store.update({key: value})
+        mock_redis.get.side_effect = store.get
+
+        cache_embedding('"abc123"', [0.5, 0.25, 1.0])
+
+        assert get_cached_embedding('"abc123"') == [0.5, 0.25, 1.0]
+        assert mock_redis.setex.call_args.args[1] == EMBEDDING_CACHE_TTL
+        assert get_cached_embedding('"outro"') is None
+
+
+def test_cache_detections_roundtrip():
+    """Testa que as detecções voltam do cache com o embedding em float32"""
+    store = {}
+    detections = [{"box": [1, 2, 3, 4], "confidence": np.float32(0.99),
+                   "embedding": np.array([0.5, 0.25], dtype=np.float32)}]
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.set.side_effect = lambda key, value, ex: store.update({key: value})
+        mock_redis.get.side_effect = store.get
+
+        cache_detections("ab12", detections)
+        restored = get_cached_detections("ab12")
+
+    assert restored[0]["box"] == [1, 2, 3, 4]
+    assert restored[0]["embedding"].dtype == np.float32
+    assert restored[0]["embedding"].tolist() == [0.5, 0.25]
+    assert get_cached_detections("outro") is None
+
+def test_job_serializer_roundtrip():
+    """Testa que argumentos/resultados dos jobs (bytes e numpy) passam pelo msgpack"""
+    payload = {"image": b"\xff\xd8\xff", "distance": np.float32(0.5), "box": np.array([1, 2, 3, 4])}
+
+    restored = job_serializer.loads(job_serializer.dumps(payload))
+
+    assert restored == {"image": b"\xff\xd8\xff", "distance": 0.5, "box": [1, 2, 3, 4]}
+
+
+def test_reserve_face_ids_seeds_once():
+    """Testa que o contador é semeado uma vez e reserva faixas consecutivas"""
+    store = {}
+    seed = Mock(return_value=41)
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.exists.side_effect = lambda key: key in store
+        mock_redis.set.side_effect = lambda key, value, nx: store.setdefault(key, value)
+        def incrby(key, amount):
+            store[key] += amount
+            return store[key]
+        mock_redis.incrby.side_effect = incrby
+
+        assert reserve_face_ids(1, seed) == 42
+        assert reserve_face_ids(3, seed) == 43
+
+    seed.assert_called_once()
+    assert store[FACE_ID_KEY] == 45
+
+
+def test_reindex_suspect_faces_moves_single_face():
+    """Testa que a atualização de uma face troca só o campo dela no índice"""
+    face = {"face_id": 3, "suspect_id": 8, "timestamp": 0, "metadata": "{}", "s3_path": ""}
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        pipe = Mock()
+        mock_redis.pipeline.return_value = pipe
+
+        reindex_suspect_faces(removed=[(7, 3)], added=[face])
+
+        pipe.hdel.assert_called_once_with("suspect:7:faces", 3)
+        pipe.hset.assert_called_once_with("suspect:8:faces", 3, orjson.dumps(face))
+        pipe.execute.assert_called_once()
+        mock_redis.scan_iter.assert_not_called()
+        mock_redis.delete.assert_not_called()
+
+
+def test_reindex_suspect_faces_redis_down_marks_index_stale():
+    """Testa que, se o Redis falhar, o índice deixa de ser servido como completo"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis:
+        mock_redis.pipeline.return_value.execute.side_effect = RedisError("down")
+
+        reindex_suspect_faces(removed=[(7, 3)])
+
+        mock_redis.delete.assert_called_once_with(SUSPECTS_INDEX_READY_KEY)
+
+
+def test_suspects_index_rebuild_checks_version_and_token():
+    """Testa que a reconstrução só marca o índice completo com a versão e o token dela"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis, \
+            patch('app.services.redis_service._FINISH_INDEX_REBUILD', return_value=0) as mock_finish:
+        mock_redis.get.return_value = b"5"
+        mock_redis.set.return_value = True
+        mock_redis.scan_iter.return_value = ["suspect:7:faces"]
+
+        rebuild = begin_suspects_index_rebuild()
+        ready = finish_suspects_index_rebuild(rebuild)
+
+        version, token = rebuild
+        assert version == "5"
+        assert mock_redis.set.call_args.args == (SUSPECTS_REBUILD_KEY, token)
+        assert mock_redis.set.call_args.kwargs["nx"] is True
+        mock_redis.delete.assert_called_once_with(SUSPECTS_INDEX_READY_KEY, "suspect:7:faces")
+        assert mock_finish.call_args.kwargs["keys"] == [
+            FACES_VERSION_KEY, SUSPECTS_INDEX_READY_KEY, SUSPECTS_REBUILD_KEY
+        ]
+        assert mock_finish.call_args.kwargs["args"] == ["5", token, "1"]
+        assert ready is False
+
+        finish_suspects_index_rebuild(rebuild, complete=False)
+        assert mock_finish.call_args.kwargs["args"] == ["5", token, "0"]
+
+
+def test_suspects_index_rebuild_loser_does_not_touch_index():
+    """Testa que uma listagem concorrente sem o token não limpa nem marca o índice"""
+    with patch('app.services.redis_service.redis_conn') as mock_redis, \
+            patch('app.services.redis_service._FINISH_INDEX_REBUILD') as mock_finish:
+        mock_redis.get.return_value = b"5"
+        mock_redis.set.return_value = None
+
+        rebuild = begin_suspects_index_rebuild()
+
+        assert rebuild is None
+        mock_redis.delete.assert_not_called()
+        mock_redis.scan_iter.assert_not_called()
+        assert finish_suspects_index_rebuild(rebuild) is False
+        mock_finish.assert_not_called()
\ No newline at end of file
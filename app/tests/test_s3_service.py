@@ -0,0 +1,53 @@
+import pytest
+from unittest.mock import Mock, patch
+from app.services import s3_service
+from app.services.s3_service import get_s3_client, download_s3_object, parse_s3_uri
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Limpa o cliente e as URLs em cache entre os testes"""
+    s3_service._S3_CLIENT = None
+    s3_service._URL_CACHE.clear()
+    yield
+    s3_service._S3_CLIENT = None
+    s3_service._URL_CACHE.clear()
+
+
+def test_get_s3_client_singleton():
+    """Testa que o cliente S3 é criado uma única vez"""
+    with patch('app.services.s3_service.boto3.client') as mock_client:
+        mock_client.return_value = Mock()
+
+        first = get_s3_client()
+        second = get_s3_client()
+
+        assert first is second
+        mock_client.assert_called_once()
+
+
+def test_download_s3_object_reuses_presigned_url():
+    """Testa que a URL pré-assinada é gerada uma vez por objeto"""
+    with patch('app.services.s3_service.boto3.client') as mock_client:
+        with patch('app.services.s3_service._SESSION.get') as mock_get:
+            client = Mock()
+            client.generate_presigned_url.return_value = "https://bucket/face.jpg?sig"
+            mock_client.return_value = client
+            mock_get.return_value = Mock(content=b"\xff\xd8\xffdata")
+
+            buffer = download_s3_object("bucket", "pasta/face.jpg")
+            download_s3_object("bucket", "pasta/face.jpg")
+
+            assert buffer.read() == b"\xff\xd8\xffdata"
+            assert buffer.name == "face.jpg"
+            client.generate_presigned_url.assert_called_once()
+            assert mock_get.call_count == 2
+
+
+def test_parse_s3_uri():
+    """Testa a separação de bucket e key e a rejeição de caminhos inválidos"""
+    assert parse_s3_uri("s3://bucket/pasta/face.jpg") == ("bucket", "pasta/face.jpg")
+
+    for invalid in ["bucket/face.jpg", "s3://bucket", "s3://bucket/", "s3:///face.jpg", ""]:
+        with pytest.raises(ValueError):
+            parse_s3_uri(invalid)
@@ -1,25 +1,50 @@
-from app.services.milvus_service import insert_face, search_similar_faces
-from app.services.embeddings_service import generate_embeddings, detect_and_search_faces
-from models.facenet import get_facenet_model
-import boto3
-import config
+from app.services.milvus_service import connect_milvus, insert_face, search_similar_faces, get_suspect_metadata
+from app.services.embeddings_service import (
+    generate_embeddings, compare_embeddings, detect_and_search_faces, sniff_image
+)
+from app.services.s3_service import get_s3_client, download_s3_object, parse_s3_uri
+from app.services.redis_service import get_cached_embedding, cache_embedding
+from concurrent.futures import ThreadPoolExecutor
+from rq import get_current_job
 from io import BytesIO
-import traceback
+import atexit
+import config
+import logging
+import orjson
+import requests
+import time
+
+# Logger do worker: o traceback é formatado pelo logging, não por print
+logger = logging.getLogger(__name__)
+
+# Pool para sobrepor I/O independente (download S3 x conexão com o Milvus)
+_EXEC = ThreadPoolExecutor(max_workers=8)
+atexit.register(_EXEC.shutdown)
+
+# O FaceNet é carregado uma vez por `run_worker.py` na subida do worker; a API
+# importa este módulo só para enfileirar e não carrega o modelo por isso.
+
+
+def _ensure_image(buffer, s3_path):
+    """Rejeita objetos que não são imagens antes de acionar o modelo."""
+    with buffer.getbuffer() as view:
+        header = bytes(view[:16])
+    if sniff_image(header) is None:
+        raise ValueError(f"Objeto {s3_path} não é uma imagem JPEG/PNG/WEBP válida.")
 
-# Carregar o modelo uma vez ao iniciar o worker:
-print("[Worker] Carregando FaceNet no processo do worker ...")
-_ = get_facenet_model()
-print("[Worker] FaceNet carregado no worker.")
 
-def process_register_face(suspect_id, s3_path, metadata=None):
+def process_register_face(suspect_id, s3_path, metadata=None, image_bytes=None):
     """
-    Processa o registro de uma face: baixa a imagem do S3, gera o embedding
-    e salva o registro no Milvus. Ao finalizar, notifica o Java via webhook.
+    Processa o registro de uma face: baixa a imagem do S3 (ou usa os bytes
+    enviados por upload), gera o embedding e salva o registro no Milvus.
+    Ao finalizar, notifica o Java via webhook.
 
     Args:
         suspect_id (int or str): ID do suspeito associado à face registrada.
-        s3_path (str): Caminho completo no formato s3://bucket/key da imagem a ser processada.
+        s3_path (str | None): Caminho completo no formato s3://bucket/key da imagem
+            a ser processada. None quando a imagem veio por upload.
         metadata (dict, optional): Metadados adicionais relacionados à face. Default é None.
+        image_bytes (bytes, optional): Conteúdo da imagem enviada por upload.
 
     Returns:
         dict: Informações do registro criado, contendo:
@@ -35,39 +60,42 @@ def process_register_face(suspect_id, s3_path, metadata=None):
     face_id = None
     
     try:
-        print(f"[Worker] Processando {s3_path} (suspect_id={suspect_id})")
-
-        # Quebra o caminho s3://bucket/key
-        if not s3_path.startswith("s3://"):
-            raise ValueError("Caminho S3 inválido. Use o formato s3://bucket/key")
-
-        parts = s3_path.replace("s3://", "").split("/", 1)
-        if len(parts) != 2:
-            raise ValueError("Caminho S3 inválido. Deve conter bucket e key")
-
-        bucket, key = parts
-        print(f"[Worker] Baixando do bucket '{bucket}' com key '{key}'...")
-
-        # Baixa a imagem do S3 para a memória
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-            region_name=config.AWS_REGION
-        )
-
-        buffer = BytesIO()
-        s3.download_fileobj(bucket, key, buffer)
-        buffer.seek(0)
-        buffer.name = key.split("/")[-1]  # nome do arquivo, útil se o modelo usa extensão
-        print(f"[Worker] Download concluído ({len(buffer.getvalue())} bytes).")
-
-        # Gera o embedding com a imagem em memória
-        embedding_result, status = generate_embeddings(buffer)
-        if status != 200:
-            raise Exception(f"Falha ao gerar embedding: {embedding_result}")
-
-        embedding = embedding_result["embedding"]
+        if image_bytes is not None:
+            # Upload local: a imagem já veio no próprio job
+            print(f"[Worker] Processando upload ({len(image_bytes)} bytes, suspect_id={suspect_id})")
+            buffer = BytesIO(image_bytes)
+            buffer.etag = None
+            connect_milvus()
+            _ensure_image(buffer, "enviado por upload")
+        else:
+            print(f"[Worker] Processando {s3_path} (suspect_id={suspect_id})")
+
+            # Quebra o caminho s3://bucket/key
+            bucket, key = parse_s3_uri(s3_path)
+            print(f"[Worker] Baixando do bucket '{bucket}' com key '{key}'...")
+
+            # Baixa a imagem do S3 enquanto conecta ao Milvus em paralelo
+            fut_img = _EXEC.submit(download_s3_object, bucket, key)
+            fut_milvus = _EXEC.submit(connect_milvus)
+            buffer = fut_img.result()
+            fut_milvus.result()
+            print(f"[Worker] Download concluído ({len(buffer.getvalue())} bytes).")
+            _ensure_image(buffer, s3_path)
+
+        # Mesma imagem (mesmo ETag) já processada: reaproveita o embedding
+        embedding = get_cached_embedding(buffer.etag) if buffer.etag else None
+
+        if embedding is None:
+            # Gera o embedding com a imagem em memória
+            embedding_result, status = generate_embeddings(buffer, save_image=False)
+            if status != 200:
+                raise Exception(f"Falha ao gerar embedding: {embedding_result}")
+
+            embedding = embedding_result["embedding"]
+            if buffer.etag:
+                cache_embedding(buffer.etag, embedding)
+        else:
+            print(f"[Worker] Embedding reaproveitado do cache (ETag {buffer.etag}).")
 
         # Insere no Milvus
         face_id = insert_face(
@@ -96,9 +124,7 @@ def process_register_face(suspect_id, s3_path, metadata=None):
         }
 
     except Exception as e:
-        import traceback
-        traceback.print_exc()
-        print(f"[Worker] ❌ Erro ao processar {s3_path}: {e}")
+        logger.exception("[Worker] ❌ Erro ao processar %s", s3_path)
         
         # 🆕 Notifica o Java que o processamento falhou
         notify_java_completion(
@@ -114,8 +140,9 @@ def process_register_face(suspect_id, s3_path, metadata=None):
 
 def process_search_face_worker(s3_path=None, top_k=5):
     """
-    Processa a busca de uma face: baixa a imagem do S3, gera o embedding,
-    encontra faces semelhantes no Milvus e registra a consulta como is_query=True.
+    Processa a busca de uma face: baixa a imagem do S3, gera o embedding e
+    encontra faces semelhantes no Milvus. A face consultada não é gravada na
+    collection; nenhum insert fica no caminho crítico da busca.
 
     Retorno (exemplo):
     {
@@ -128,61 +155,42 @@ def process_search_face_worker(s3_path=None, top_k=5):
         ... # resto do result vindo de detect_and_search_faces (winner_match, boxes, matches, etc)
     }
     """
-    import boto3
-    from io import BytesIO
-    import traceback
-    import time
-    import os
-    from PIL import Image
-    import numpy as np
-    import cv2
-    from app.services.embeddings_service import detect_and_search_faces
-
     try:
         print(f"[Worker]  Processando busca MULTI-ROSTO (S3 path={s3_path})")
 
-        if not s3_path or not s3_path.startswith("s3://"):
-            raise ValueError("Caminho S3 inválido. Use s3://bucket/key")
-
         # ---- Extrair bucket e key ----
-        bucket, key = s3_path.replace("s3://", "").split("/", 1)
+        bucket, key = parse_s3_uri(s3_path)
         print(f"[Worker]  Baixando imagem do bucket '{bucket}', key '{key}' ...")
 
-        s3 = boto3.client(
-            "s3",
-            aws_access_key_id=config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=config.AWS_SECRET_ACCESS_KEY,
-            region_name=config.AWS_REGION
-        )
+        s3 = get_s3_client()
 
         # ---- URL pública (sem credenciais) ----
         original_url = f"https://{bucket}.s3.{config.AWS_REGION}.amazonaws.com/{key}"
 
-        # ---- Baixar imagem original ----
-        buffer = BytesIO()
-        s3.download_fileobj(bucket, key, buffer)
-        buffer.seek(0)
-        buffer.name = key.split("/")[-1]
+        # ---- Baixar imagem original (conectando ao Milvus em paralelo) ----
+        fut_img = _EXEC.submit(download_s3_object, bucket, key)
+        fut_milvus = _EXEC.submit(connect_milvus)
+        buffer = fut_img.result()
+        fut_milvus.result()
         print(f"[Worker]  Download concluído ({len(buffer.getvalue())} bytes).")
+        _ensure_image(buffer, s3_path)
 
         # ---- Rodar detecção e busca ----
-        result, status = detect_and_search_faces(buffer, top_k=top_k)
+        result, status = detect_and_search_faces(buffer, top_k=top_k, encode_image=True)
         if status != 200:
             raise Exception(f"Falha no processamento: {result}")
 
-        processed_local_path = result.get("processed_image_path")
-        if not processed_local_path or not os.path.exists(processed_local_path):
-            raise Exception("processed_image_path inválido ou arquivo não encontrado.")
+        # ---- Imagem processada já codificada em memória (sem disco) ----
+        processed_bytes = result.pop("processed_image_bytes", None)
+        if not processed_bytes:
+            raise Exception("Imagem processada não foi gerada.")
 
-        # ---- Ler imagem processada ----
-        with open(processed_local_path, "rb") as f:
-            processed_bytes = f.read()
-
-        # ---- Upload da imagem processada ----
+        # ---- Upload da imagem processada (em segundo plano) ----
         timestamp = int(time.time() * 1000)
         new_key = f"{key}_box-faces_{timestamp}"
 
-        s3.put_object(
+        fut_upload = _EXEC.submit(
+            s3.put_object,
             Bucket=bucket,
             Key=new_key,
             Body=processed_bytes,
@@ -192,8 +200,6 @@ def process_search_face_worker(s3_path=None, top_k=5):
         processed_s3_path = f"s3://{bucket}/{new_key}"
         processed_url = f"https://{bucket}.s3.{config.AWS_REGION}.amazonaws.com/{new_key}"
 
-        print(f"[Worker]  Imagem processada enviada ao S3: {processed_s3_path}")
-
         # ---- Calcular number of faces detected (heurística robusta) ----
         faces_count = 0
         # checar chaves comuns que podem conter listas de deteccoes/caixas
@@ -216,6 +222,10 @@ def process_search_face_worker(s3_path=None, top_k=5):
                 if isinstance(boxes, list):
                     faces_count = len(boxes)
 
+        # ---- Aguardar o upload antes de devolver as URLs ----
+        fut_upload.result()
+        print(f"[Worker]  Imagem processada enviada ao S3: {processed_s3_path}")
+
         # ---- Montar retorno final (mantendo todo result) ----
         final = {
             "source": "s3",
@@ -230,13 +240,76 @@ def process_search_face_worker(s3_path=None, top_k=5):
         return final
 
     except Exception as e:
-        print("[Worker] Erro no process_search_face_worker:")
-        traceback.print_exc()
+        logger.exception("[Worker] Erro no process_search_face_worker (%s)", s3_path)
         # Retorna dicionário de erro consistente para o endpoint consumir
         return {"error": str(e)}
 
 
-    
+def process_search_face_upload(image_bytes, top_k=5):
+    """
+    Processa no worker a busca de uma imagem enviada por upload (`?async=1`).
+
+    Mesmo resultado da busca imediata da Rota 2, mas a decodificação e a
+    inferência do FaceNet saem da thread da requisição.
+
+    Args:
+        image_bytes (bytes): Conteúdo da imagem enviada.
+        top_k (int): Número máximo de resultados por rosto.
+
+    Returns:
+        dict: Resultado de `detect_and_search_faces` com `suspect_metadata`.
+    """
+    print(f"[Worker]  Processando busca de upload ({len(image_bytes)} bytes)")
+
+    buffer = BytesIO(image_bytes)
+    _ensure_image(buffer, "upload")
+
+    result, status = detect_and_search_faces(buffer, top_k=top_k, save_image=False)
+    if status != 200:
+        raise Exception(f"Falha no processamento: {result}")
+
+    winner = result.get("winner_match")
+    suspect_metadata = None
+    if winner and winner.get("suspect_id") is not None:
+        suspect_metadata = get_suspect_metadata(winner["suspect_id"])
+
+    return {
+        **result,
+        "original_s3": None,
+        "processed_s3": None,
+        "original_url": None,
+        "processed_url": None,
+        "suspect_metadata": suspect_metadata
+    }
+
+
+def process_generate_embeddings(image_bytes):
+    """
+    Gera o embedding de uma imagem no worker de inferência (fila de embeddings).
+
+    A imagem processada não é gravada: um arquivo no disco do worker não
+    seria acessível pela API, então `processed_image_path` volta null.
+
+    Args:
+        image_bytes (bytes): Conteúdo da imagem enviada à API.
+
+    Returns:
+        list: [resultado de `generate_embeddings`, código HTTP].
+    """
+    result, status = generate_embeddings(BytesIO(image_bytes), save_image=False)
+    return [result, status]
+
+
+def process_compare_embeddings(image1_bytes, image2_bytes, threshold=0.7):
+    """
+    Compara duas imagens no worker de inferência (fila de embeddings).
+
+    Returns:
+        list: [resultado de `compare_embeddings`, código HTTP].
+    """
+    result, status = compare_embeddings(BytesIO(image1_bytes), BytesIO(image2_bytes), threshold=threshold)
+    return [result, status]
+
 
 def process_search_face_async_worker(request_id, s3_path, top_k=5):
     """
@@ -272,8 +345,7 @@ def process_search_face_async_worker(request_id, s3_path, top_k=5):
         return result
         
     except Exception as e:
-        print(f"[Worker] ❌ Erro na busca assíncrona - requestId: {request_id}, erro: {e}")
-        traceback.print_exc()
+        logger.exception("[Worker] ❌ Erro na busca assíncrona - requestId: %s", request_id)
         
         # Chama callback no Java com erro
         notify_java_search_completion(
@@ -298,8 +370,6 @@ def notify_java_search_completion(request_id, suspect_id, s3_path, status, error
         status (str): 'completed' ou 'failed'
         error (str, optional): Mensagem de erro
     """
-    import requests
-    
     # URL do endpoint Java para callback de busca
     callback_url = "http://localhost:8080/api/nexus/webhooks/complete-search"
     
@@ -320,7 +390,7 @@ def notify_java_search_completion(request_id, suspect_id, s3_path, status, error
         
         response = requests.post(
             callback_url,
-            json=payload,
+            data=orjson.dumps(payload),
             timeout=10,
             headers={"Content-Type": "application/json"}
         )
@@ -350,9 +420,6 @@ def notify_java_completion(suspect_id, face_id, s3_path, status, error=None):
     Returns:
         None
     """
-    import requests
-    from rq import get_current_job
-    
     # Obtém o job_id do RQ (se disponível)
     job = get_current_job()
     job_id = job.get_id() if job else None
@@ -374,7 +441,7 @@ def notify_java_completion(suspect_id, face_id, s3_path, status, error=None):
         print(f"[Worker] 🔔 Enviando webhook para Java: {webhook_url}")
         response = requests.post(
             webhook_url,
-            json=payload,
+            data=orjson.dumps(payload),
             timeout=10,  # timeout de 10 segundos
             headers={"Content-Type": "application/json"}
         )
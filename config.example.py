@@ -5,9 +5,11 @@
 # ============================================================
 import os
 
-AWS_ACCESS_KEY_ID = "SUA_ACCESS_KEY_AQUI"
-AWS_SECRET_ACCESS_KEY = "SUA_SECRET_KEY_AQUI"
-AWS_REGION = "us-east-2"  # ou a região que você usa
+# Credenciais lidas do ambiente. Se não definidas (None), o boto3 usa a
+# cadeia padrão de credenciais (~/.aws, IAM role, etc.).
+AWS_ACCESS_KEY_ID = os.getenv("AWS_ACCESS_KEY_ID")
+AWS_SECRET_ACCESS_KEY = os.getenv("AWS_SECRET_ACCESS_KEY")
+AWS_REGION = os.getenv("AWS_REGION", "us-east-2")  # ou a região que você usa
 
 JAVA_WEBHOOK_URL = os.getenv(
     "JAVA_WEBHOOK_URL", 
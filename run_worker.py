@@ -2,13 +2,17 @@ import os
 from rq import SimpleWorker, Queue
 from redis import Redis
 from models.facenet import get_facenet_model
+from app.services.redis_service import job_serializer
 
 # Lê o REDIS_URL da variável de ambiente ou usa localhost como fallback
 redis_url = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 redis_conn = Redis.from_url(redis_url)
 
-# Filas que o worker vai ouvir
-listen = ['faces_register_queue', 'faces_search_queue']
+# Filas que o worker vai ouvir (WORKER_QUEUES separa por vírgula; ex.:
+# WORKER_QUEUES=faces_embeddings_queue para um worker dedicado à inferência)
+listen = os.getenv(
+    "WORKER_QUEUES", "faces_register_queue,faces_search_queue,faces_embeddings_queue"
+).split(",")
 
 def run_worker():
     print(f"[Worker] Iniciado. Conectado em: {redis_url}")
@@ -19,8 +23,9 @@ def run_worker():
     _ = get_facenet_model()
     print("[Worker] FaceNet carregado no worker.")
     
-    queues = [Queue(name, connection=redis_conn) for name in listen]
-    worker = SimpleWorker(queues, connection=redis_conn)
+    # Mesmo serializer (msgpack) usado pela API ao enfileirar
+    queues = [Queue(name, connection=redis_conn, serializer=job_serializer) for name in listen]
+    worker = SimpleWorker(queues, connection=redis_conn, serializer=job_serializer)
     
     # burst=False => fica ouvindo continuamente
     worker.work(burst=False)